@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CloAppConfig(AppConfig):
     name = 'clo_app'
+
+    def ready(self):
+        from . import sqlite
+        connection_created.connect(sqlite.configure_connection)
@@ -0,0 +1,177 @@
+"""Catalog versions: which one is active, and precomputed snapshots of each.
+
+A snapshot records, for every program in a catalog, the set of specific courses
+it uses and which of those courses provide each core learning outcome. Programs
+are matched between catalogs by label, since the ids change with every import,
+so "how did this program change between years" is answered by diffing two
+snapshots without touching the program tables at all."""
+
+import json
+import threading
+from collections import OrderedDict
+from django.db import transaction
+
+from . import models
+from . import matrices
+
+
+def active_catalog():
+    """Return the active Catalog, or None if nothing has been imported yet."""
+    pointer = models.ActiveCatalog.objects.select_related("catalog").first()
+    if pointer is None:
+        return None
+    return pointer.catalog
+
+def requested_catalog(request):
+    """Return the catalog asked for with ?catalog=<id>, falling back to the
+    active one."""
+    catalog_id = request.GET.get("catalog")
+    if catalog_id and catalog_id.isdigit():
+        try:
+            return models.Catalog.objects.get(id=int(catalog_id))
+        except models.Catalog.DoesNotExist:
+            pass
+    return active_catalog()
+
+def activate(catalog):
+    """Make catalog the one the site serves by default."""
+    with transaction.atomic():
+        pointer = models.ActiveCatalog.objects.select_for_update().first()
+        if pointer is None:
+            models.ActiveCatalog.objects.create(catalog=catalog)
+        else:
+            models.ActiveCatalog.objects.filter(id=pointer.id).update(
+                catalog=catalog)
+
+def programs_in(catalog):
+    """Return the DegreeProgram queryset for catalog, or every program if there
+    are no catalogs at all."""
+    if catalog is None:
+        return models.DegreeProgram.objects.all()
+    return models.DegreeProgram.objects.filter(catalog=catalog)
+
+def describe_courses(courses, catalog):
+    """Set the label and credit bounds of each Course in courses to what
+    catalog says about it, without saving, and return them as a list."""
+    courses = list(courses)
+    details = matrices.course_details([course.id for course in courses],
+                                      catalog)
+    for course in courses:
+        if course.id in details:
+            (course.label, course.lower_credit_bound,
+             course.upper_credit_bound) = details[course.id]
+    return courses
+
+
+def build_snapshot_data(programs, program_courses, course_outcomes, clo_ids):
+    """Build the snapshot dictionary out of already fetched catalog data.
+
+    programs - List of (program_id, label) pairs.
+    program_courses - {program_id: {course_id: elective}}
+    course_outcomes - {course_id: bitmask}
+    clo_ids - Every core learning outcome id."""
+    snapshot = {}
+    for program_id, label in programs:
+        courses = sorted(program_courses.get(program_id, {}))
+        outcomes = {}
+        for clo_id in clo_ids:
+            bit = matrices.outcome_bit(clo_id)
+            outcomes[str(clo_id)] = [course for course in courses
+                                     if course_outcomes.get(course, 0) & bit]
+        snapshot[label] = {"id":program_id,
+                           "courses":courses,
+                           "outcomes":outcomes}
+    return snapshot
+
+def snapshot_inputs(catalog):
+    """Fetch everything build_snapshot_data needs for catalog, as a tuple of
+    plain Python values that can be handed to another process."""
+    programs = list(programs_in(catalog).order_by("id").values_list(
+        "id", "label"))
+    program_ids = [program_id for program_id, label in programs]
+    program_courses = matrices.program_courses(program_ids)
+    course_ids = set()
+    for courses in program_courses.values():
+        course_ids.update(courses)
+    course_outcomes = matrices.course_outcomes(course_ids, catalog)
+    clo_ids = list(models.CoreLearningOutcome.objects.order_by(
+        "id").values_list("id", flat=True))
+    return (programs, program_courses, course_outcomes, clo_ids)
+
+def publish_snapshot(catalog, data):
+    """Save data as the newest snapshot of catalog and return it.
+
+    Readers always take the newest snapshot, so until this commits they keep
+    getting the previous one. We keep that previous one around as well in case
+    a reader is still partway through using it."""
+    with transaction.atomic():
+        latest = models.CatalogSnapshot.objects.create(catalog=catalog,
+                                                       data=json.dumps(data))
+        stale = models.CatalogSnapshot.objects.filter(
+            catalog=catalog).order_by("-id").values_list("id", flat=True)[2:]
+        models.CatalogSnapshot.objects.filter(id__in=list(stale)).delete()
+    return latest
+
+def build_snapshot(catalog):
+    """Compute and save a fresh CatalogSnapshot for catalog and return it."""
+    return publish_snapshot(catalog,
+                            build_snapshot_data(*snapshot_inputs(catalog)))
+
+def snapshot(catalog):
+    """Return the decoded latest snapshot for catalog.
+
+    If the worker hasn't published one yet we work it out on the spot but don't
+    save it, since request workers may only have a read-only connection."""
+    latest = models.CatalogSnapshot.objects.filter(
+        catalog=catalog).order_by("-id").first()
+    if latest is None:
+        return build_snapshot_data(*snapshot_inputs(catalog))
+    return _decode_snapshot(latest.id, latest.data)
+
+# A handful is plenty, the diff page only ever needs two at once
+MAX_DECODED_SNAPSHOTS = 8
+
+_decoded_snapshots = OrderedDict()
+# Threaded workers share the cache, and one thread evicting an entry between
+# another's lookup and move_to_end would raise KeyError
+_decoded_snapshots_lock = threading.Lock()
+
+def _decode_snapshot(snapshot_id, data):
+    """Decode snapshot JSON, keeping the most recently used results around
+    since snapshots are never modified once written."""
+    with _decoded_snapshots_lock:
+        decoded = _decoded_snapshots.get(snapshot_id)
+        if decoded is not None:
+            _decoded_snapshots.move_to_end(snapshot_id)
+            return decoded
+    # Decode outside the lock so other threads aren't kept waiting on it
+    decoded = json.loads(data)
+    with _decoded_snapshots_lock:
+        _decoded_snapshots[snapshot_id] = decoded
+        if len(_decoded_snapshots) > MAX_DECODED_SNAPSHOTS:
+            _decoded_snapshots.popitem(last=False)
+    return decoded
+
+
+def diff_program(old, new):
+    """Given the snapshot entries for the same program in two catalogs, return
+    what changed between them.
+
+    Either entry may be None if the program only exists in one catalog."""
+    old = old or {"courses":[], "outcomes":{}}
+    new = new or {"courses":[], "outcomes":{}}
+    old_courses = set(old["courses"])
+    new_courses = set(new["courses"])
+    outcome_changes = []
+    for clo_id in sorted(set(old["outcomes"]) | set(new["outcomes"]), key=int):
+        before = set(old["outcomes"].get(clo_id, []))
+        after = set(new["outcomes"].get(clo_id, []))
+        outcome_changes.append({"clo_id":int(clo_id),
+                                "before":len(before),
+                                "after":len(after),
+                                "added":sorted(after - before),
+                                "removed":sorted(before - after)})
+    return {"added_courses":sorted(new_courses - old_courses),
+            "removed_courses":sorted(old_courses - new_courses),
+            "kept_courses":sorted(old_courses & new_courses),
+            "outcomes":outcome_changes}
@@ -0,0 +1,105 @@
+"""Side by side comparison of any number of degree programs.
+
+Everything is fetched with one batched query per model and then worked out in
+memory. Each program gets a bit, each course gets a mask of the programs that
+use it, so "shared by all", "only in this one" and friends are just integer
+comparisons no matter how many programs are being compared."""
+
+from . import models
+from . import matrices
+from . import credits
+
+
+def compare_programs(program_ids):
+    """Compare the degree programs with the given ids and return a dict for the
+    compare template.
+
+    programs - The DegreeProgram objects in the order they were asked for,
+    each with its ProgramCredits attached as .totals.
+    course_rows - (course, [in program?...], [provides CLO?...]) for every
+    course used by any of the programs.
+    shared_courses - Courses in every program.
+    unique_courses - [(program, [courses only it uses])...]
+    outcome_rows - (outcome, [number of courses providing it per program])"""
+    program_objects = models.DegreeProgram.objects.in_bulk(program_ids)
+    programs = [program_objects[pid] for pid in program_ids
+                if pid in program_objects]
+    program_bits = {program.id:1 << index
+                    for index, program in enumerate(programs)}
+    all_programs = (1 << len(programs)) - 1
+
+    incidence = matrices.program_courses(list(program_bits))
+    course_programs = {}
+    for program_id, courses in incidence.items():
+        for course_id in courses:
+            course_programs[course_id] = (course_programs.get(course_id, 0)
+                                          | program_bits[program_id])
+    # Programs from different catalogs can disagree about a course, so every
+    # program is measured against its own catalog's version of it
+    catalog_courses = {}
+    catalog_outcomes = {}
+    for catalog_id in set(program.catalog_id for program in programs):
+        course_ids = set()
+        for program in programs:
+            if program.catalog_id == catalog_id:
+                course_ids.update(incidence.get(program.id, {}))
+        catalog_courses[catalog_id] = {
+            course_id:models.Course(id=course_id,
+                                    label=label,
+                                    lower_credit_bound=lower,
+                                    upper_credit_bound=upper)
+            for course_id, (label, lower, upper) in matrices.course_details(
+                course_ids, catalog_id).items()}
+        catalog_outcomes[catalog_id] = matrices.course_outcomes(
+            list(course_ids), catalog_id)
+    # Courses listed across programs are shown as the first program that uses
+    # them has them
+    courses = {}
+    course_outcomes = {}
+    for program in reversed(programs):
+        for course_id in incidence.get(program.id, {}):
+            courses[course_id] = catalog_courses[program.catalog_id][course_id]
+            course_outcomes[course_id] = catalog_outcomes[
+                program.catalog_id].get(course_id, 0)
+    outcomes = list(models.CoreLearningOutcome.objects.order_by("id"))
+
+    # The same totals the program page and credit audit show
+    program_credits = credits.credits_for_programs(programs)
+    for program in programs:
+        program.totals = program_credits[program.id]
+
+    ordered_courses = sorted(course_programs)
+    course_rows = []
+    for course_id in ordered_courses:
+        program_mask = course_programs[course_id]
+        outcome_mask = course_outcomes.get(course_id, 0)
+        course_rows.append(
+            (courses[course_id],
+             [bool(program_mask & program_bits[program.id])
+              for program in programs],
+             [bool(outcome_mask & matrices.outcome_bit(outcome.id))
+              for outcome in outcomes]))
+
+    shared_courses = [courses[course_id] for course_id in ordered_courses
+                      if course_programs[course_id] == all_programs]
+    unique_courses = [(program,
+                       [courses[course_id] for course_id in ordered_courses
+                        if course_programs[course_id] == program_bits[program.id]])
+                      for program in programs]
+
+    outcome_rows = []
+    for outcome in outcomes:
+        bit = matrices.outcome_bit(outcome.id)
+        outcome_rows.append(
+            (outcome,
+             [sum(1 for course_id in incidence.get(program.id, {})
+                  if catalog_outcomes[program.catalog_id].get(course_id, 0)
+                  & bit)
+              for program in programs]))
+
+    return {"programs":programs,
+            "outcomes":outcomes,
+            "course_rows":course_rows,
+            "shared_courses":shared_courses,
+            "unique_courses":unique_courses,
+            "outcome_rows":outcome_rows}
@@ -0,0 +1,208 @@
+"""Credit totals for degree programs, worked out for a whole catalog at once.
+
+A course can be worth a range of credits and a required course can often be
+swapped for one of its substitutes, so a program doesn't have one credit total
+but a minimum and a maximum. We lay the course credit bounds out as two arrays
+indexed by course, turn every program into a list of indices into them, and
+then each total is a sum over a slice of the arrays instead of a query.
+
+Programs whose totals can't be made to add up to the credits they declare are
+flagged so someone can go look at the source data."""
+
+from django.db import transaction
+
+from . import models
+from . import matrices
+from . import catalogs
+
+# Declared and computed totals closer than this are considered equal
+TOLERANCE = 0.01
+
+
+def credit_inputs(program_queryset, catalog=None):
+    """Fetch everything compute_credits needs for the programs in
+    program_queryset, as plain Python values, with course credits as catalog
+    gives them."""
+    programs = list(program_queryset.order_by("id").values_list(
+        "id", "credits", "elective_credits"))
+    program_ids = [program[0] for program in programs]
+    program_courses = matrices.program_courses(program_ids)
+    specific, generic_substitutes = matrices.substitute_edges(program_ids)
+    course_ids = set(course for pid, parent, course in specific)
+    for courses in program_courses.values():
+        course_ids.update(courses)
+    course_bounds = {course_id:(lower, upper) for course_id, (label, lower, upper)
+                     in matrices.course_details(course_ids, catalog).items()}
+    generics = list(models.DPCourseGeneric.objects.filter(
+        degree_program_id__in=program_ids).values_list(
+            "degree_program_id", "credits", "elective"))
+    return (programs, program_courses, course_bounds, specific,
+            generic_substitutes, generics)
+
+def compute_credits(programs, program_courses, course_bounds, specific,
+                    generic_substitutes, generics):
+    """Work out the credit totals for every program.
+
+    programs - List of (program_id, credits, elective_credits)
+    program_courses - {program_id: {course_id: elective}}
+    course_bounds - {course_id: (lower_credit_bound, upper_credit_bound)}
+    specific - Substitution edges (program_id, parent_course_id, course_id)
+    generic_substitutes - (program_id, parent_course_id, credit_type, credits,
+    elective)
+    generics - List of (program_id, credits, elective)
+
+    Returns {program_id: dict of totals and a list of problems}."""
+    # Lay the credit bounds out as arrays so a program is a list of indices
+    course_ids = sorted(course_bounds)
+    index = {course_id:position for position, course_id in enumerate(course_ids)}
+    lower = [course_bounds[course_id][0] for course_id in course_ids]
+    upper = [course_bounds[course_id][1] for course_id in course_ids]
+    unknown = [bound is None for bound in lower]
+    lower = [bound or 0 for bound in lower]
+    upper = [bound or 0 for bound in upper]
+
+    # A required course with substitutes counts as its cheapest and dearest
+    # alternative rather than as itself
+    alternatives = {}
+    for program_id, parent, course in specific:
+        alternatives.setdefault((program_id, parent), []).append(index[course])
+    generic_alternatives = {}
+    for program_id, parent, credit_type, credits, elective in generic_substitutes:
+        generic_alternatives.setdefault((program_id, parent), []).append(
+            credits or 0)
+
+    generic_required = {}
+    generic_elective = {}
+    for program_id, credits, elective in generics:
+        totals = generic_elective if elective else generic_required
+        totals[program_id] = totals.get(program_id, 0) + (credits or 0)
+
+    results = {}
+    for program_id, declared, elective_credits in programs:
+        courses = program_courses.get(program_id, {})
+        required = [course for course, elective in courses.items()
+                    if not elective]
+        electives = [index[course] for course, elective in courses.items()
+                     if elective]
+        required_lower = required_upper = 0
+        for course in required:
+            choices = [index[course]] + alternatives.get((program_id, course),
+                                                         [])
+            known = [choice for choice in choices if not unknown[choice]]
+            extra = generic_alternatives.get((program_id, course), [])
+            required_lower += min([lower[choice] for choice in known] + extra,
+                                  default=0)
+            required_upper += max([upper[choice] for choice in known] + extra,
+                                  default=0)
+        elective_lower = sum(lower[choice] for choice in electives)
+        elective_upper = sum(upper[choice] for choice in electives)
+        generic = generic_required.get(program_id, 0)
+        total_lower = required_lower + generic + (elective_credits or 0)
+        total_upper = required_upper + generic + (elective_credits or 0)
+
+        problems = []
+        missing = sorted(course for course in courses
+                         if unknown[index[course]])
+        if missing:
+            problems.append("No credits recorded for {}.".format(
+                ", ".join(missing)))
+        if declared is not None and not (
+                total_lower - TOLERANCE <= declared <= total_upper + TOLERANCE):
+            problems.append(
+                "Courses add up to {:g}-{:g} credits but the program declares"
+                " {:g}.".format(total_lower, total_upper, declared))
+        if (elective_credits and electives
+                and elective_upper + TOLERANCE < elective_credits):
+            problems.append(
+                "Only {:g} elective credits are listed but {:g} are"
+                " required.".format(elective_upper, elective_credits))
+        results[program_id] = {"required_lower":required_lower,
+                               "required_upper":required_upper,
+                               "elective_lower":elective_lower,
+                               "elective_upper":elective_upper,
+                               "generic_required":generic,
+                               "generic_elective":generic_elective.get(
+                                   program_id, 0),
+                               "total_lower":total_lower,
+                               "total_upper":total_upper,
+                               "problems":problems}
+    return results
+
+def catalog_credit_inputs(catalog):
+    """credit_inputs for every program in catalog."""
+    return credit_inputs(catalogs.programs_in(catalog), catalog)
+
+def publish_credits(catalog, results):
+    """Replace the saved ProgramCredits for the programs in results."""
+    rows = [models.ProgramCredits(degree_program_id=program_id,
+                                  required_lower=totals["required_lower"],
+                                  required_upper=totals["required_upper"],
+                                  elective_lower=totals["elective_lower"],
+                                  elective_upper=totals["elective_upper"],
+                                  generic_required=totals["generic_required"],
+                                  generic_elective=totals["generic_elective"],
+                                  total_lower=totals["total_lower"],
+                                  total_upper=totals["total_upper"],
+                                  problems="\n".join(totals["problems"]))
+            for program_id, totals in results.items()]
+    with transaction.atomic():
+        models.ProgramCredits.objects.filter(
+            degree_program_id__in=list(results)).delete()
+        models.ProgramCredits.objects.bulk_create(rows)
+
+def program_credits(program):
+    """Return the ProgramCredits for program, working them out on the spot
+    (without saving) if the worker hasn't got to it yet."""
+    try:
+        return models.ProgramCredits.objects.get(degree_program=program)
+    except models.ProgramCredits.DoesNotExist:
+        pass
+    totals = compute_credits(*credit_inputs(
+        models.DegreeProgram.objects.filter(id=program.id), program.catalog_id))
+    return unsaved_credits(program.id, totals[program.id])
+
+def catalog_credits(catalog):
+    """Return [(program, ProgramCredits)] for every program in catalog, sorted
+    by label. Programs the worker hasn't got to yet are worked out together in
+    one go rather than one at a time."""
+    programs = list(catalogs.programs_in(catalog).select_related(
+        "programcredits").order_by("label"))
+    missing = [program.id for program in programs
+               if not hasattr(program, "programcredits")]
+    computed = {}
+    if missing:
+        computed = compute_credits(*credit_inputs(
+            models.DegreeProgram.objects.filter(id__in=missing), catalog))
+    return [(program,
+             program.programcredits if program.id not in computed
+             else unsaved_credits(program.id, computed[program.id]))
+            for program in programs]
+
+def credits_for_programs(programs):
+    """Return {program_id: ProgramCredits} for the DegreeProgram objects in
+    programs, which may come from different catalogs. Programs the worker
+    hasn't got to yet are worked out catalog by catalog without saving."""
+    results = {row.degree_program_id:row
+               for row in models.ProgramCredits.objects.filter(
+                   degree_program_id__in=[program.id
+                                          for program in programs])}
+    missing = {}
+    for program in programs:
+        if program.id not in results:
+            missing.setdefault(program.catalog_id, []).append(program.id)
+    for catalog_id, program_ids in missing.items():
+        computed = compute_credits(*credit_inputs(
+            models.DegreeProgram.objects.filter(id__in=program_ids),
+            catalog_id))
+        for program_id, totals in computed.items():
+            results[program_id] = unsaved_credits(program_id, totals)
+    return results
+
+def unsaved_credits(program_id, totals):
+    """Turn one program's compute_credits result into an unsaved
+    ProgramCredits."""
+    totals = dict(totals)
+    problems = "\n".join(totals.pop("problems"))
+    return models.ProgramCredits(degree_program_id=program_id,
+                                 problems=problems,
+                                 **totals)
@@ -0,0 +1,298 @@
+"""Parsing for the degree program .csv, kept apart from the import command.
+
+See the long comment at the top of the degree_program_import command for what
+the file looks like. Nothing in here touches the database."""
+
+import re
+import csv
+
+# Matches class ID's such as "MATH 110" or "ENGL& 101"
+CLASS_ID_RE = re.compile("[A-Z]+&* [0-9]+")
+
+# Problems that stop the import, shared with the validation so both say the
+# same thing
+ORPHAN_ROW = "Row before the first ATA line, the import won't run."
+NO_PROGRAMS = "No ATA program lines found."
+SHORT_COURSE_ROW = "Course row has fewer than 4 columns."
+SHORT_PROGRAM_ROW = "Program line needs credits and elective credits columns."
+
+
+def read_numbered_program_rows(programs_csv):
+    """Read the open .csv file and return (programs, orphans).
+
+    programs - A list with one entry per degree program, each a list of
+    (line number, row) pairs starting with the program's ATA line.
+    orphans - (line number, row) pairs that came before the first ATA line.
+
+    Blank rows are dropped. Both the import and the validation read the file
+    through here, so they always agree about what's in it."""
+    reader = csv.reader(programs_csv)
+    programs = []
+    orphans = []
+    for row in reader:
+        if reader.line_num == 1 or not any(row):
+            continue
+        if row[0].startswith("ATA"):
+            programs.append([(reader.line_num, row)])
+        elif programs:
+            programs[-1].append((reader.line_num, row))
+        else:
+            orphans.append((reader.line_num, row))
+    return (programs, orphans)
+
+def is_course_row(row):
+    """Return True for the rows that hold a course or a generic requirement,
+    as opposed to section headings and other rows that are only there to
+    look at."""
+    return bool(CLASS_ID_RE.fullmatch(row[0].strip())
+                or row[0].startswith("Generic"))
+
+def read_degree_program_rows(programs_csv):
+    """Read the open .csv file and return a list of row lists, one per degree
+    program, each starting with the program's ATA line followed by its course
+    rows.
+
+    Raises ValueError for the problems validate_file reports as stopping the
+    import: rows before the first ATA line, no ATA lines at all and program
+    or course rows with too few columns."""
+    programs, orphans = read_numbered_program_rows(programs_csv)
+    if orphans:
+        raise ValueError("Line {}: {}".format(orphans[0][0], ORPHAN_ROW))
+    if not programs:
+        raise ValueError(NO_PROGRAMS)
+    degree_program_rows = []
+    for program in programs:
+        if len(program[0][1]) < 3:
+            raise ValueError("Line {}: {}".format(program[0][0],
+                                                  SHORT_PROGRAM_ROW))
+        program_rows = [program[0][1]]
+        for line_number, row in program[1:]:
+            if not is_course_row(row):
+                continue
+            if len(row) < 4:
+                raise ValueError("Line {}: {}".format(line_number,
+                                                      SHORT_COURSE_ROW))
+            program_rows.append(row)
+        degree_program_rows.append(program_rows)
+    return degree_program_rows
+
+def credit_bounds(credit_string):
+    """Return the (lower, upper) credit bounds in a credit cell.
+
+    If credit is numeric it's both bounds, otherwise we split the credit range.
+    Anything else gives (None, None)."""
+    try:
+        return (float(credit_string), float(credit_string))
+    except ValueError:
+        if "-" in credit_string:
+            bounds = credit_string.split("-")
+            return (float(bounds[0]), float(bounds[1]))
+        else:
+            return (None, None)
+
+# Generic requirement rows name their credit type somewhere in the first cell
+GENERIC_CREDIT_TYPES = [(re.compile("Communication"), "CS"),
+                        (re.compile("Natural Science"), "NS"),
+                        (re.compile("Humanities"), "H"),
+                        (re.compile("Performance"), "HP"),
+                        (re.compile("Social"), "SS"),
+                        (re.compile("Lab"), "NSL"),
+                        (re.compile("Quant"), "QS"),
+                        (re.compile("Elective"), "E"),
+                        (re.compile("Diversity"), "DC"),
+                        (re.compile("Prereq"), "PR")]
+
+def generic_credit_type(course_id):
+    """Return the CreditType label_short named in a generic row's first cell,
+    or None if we can't tell."""
+    for credit_type_re, label_short in GENERIC_CREDIT_TYPES:
+        if credit_type_re.search(course_id):
+            return label_short
+    return None
+
+
+# Validation
+#
+# Everything below checks a file without importing it. The rows are grouped by
+# program by the same read_numbered_program_rows the import uses, keeping every
+# row and its line number so we can point at the rows the import would
+# silently skip.
+
+# Something that looks like it was meant to be a class ID, e.g. "Math110",
+# when it also has a course title next to it
+LOOSE_CLASS_ID_RE = re.compile("[A-Za-z]+&? *[0-9]+[A-Za-z]?")
+
+def parse_optional_float(cell):
+    """Return cell as a float, or None if it's blank or "N.A.". Raises
+    ValueError for anything else."""
+    if not cell.strip() or cell.strip().upper().startswith("N.A"):
+        return None
+    return float(cell)
+
+def validate_programs(programs, clo_ids):
+    """Check a list of programs from read_numbered_program_rows and return a
+    list of (line number, message) for everything wrong with them.
+
+    clo_ids - The core learning outcome ids that exist. This only looks at its
+    arguments, so chunks of programs can be checked in separate processes."""
+    issues = []
+    for program in programs:
+        issues += validate_program(program, set(clo_ids))
+    return issues
+
+def validate_program(program, clo_ids):
+    """Check a single program, see validate_programs."""
+    from clo_app import credits
+    ata_line_number, ata = program[0]
+    issues = []
+
+    def report(line_number, message):
+        issues.append((line_number, "{}: {}".format(ata[0].strip(), message)))
+
+    declared = elective_credits = None
+    if len(ata) < 3:
+        report(ata_line_number, SHORT_PROGRAM_ROW)
+    else:
+        try:
+            declared = parse_optional_float(ata[1])
+            if declared is None:
+                report(ata_line_number, "Program has no credits, which the"
+                       " import requires.")
+        except ValueError:
+            report(ata_line_number,
+                   "Can't read program credits {!r}.".format(ata[1]))
+        try:
+            elective_credits = parse_optional_float(ata[2])
+        except ValueError:
+            report(ata_line_number,
+                   "Can't read elective credits {!r}.".format(ata[2]))
+
+    # Split rows the import would use from rows it would drop
+    course_rows = []
+    for line_number, row in program[1:]:
+        cell = row[0].strip()
+        if is_course_row(row):
+            if len(row) < 4:
+                report(line_number, SHORT_COURSE_ROW)
+                continue
+            course_rows.append((line_number, row))
+        elif LOOSE_CLASS_ID_RE.fullmatch(cell) and len(row) > 1 and row[1].strip():
+            report(line_number, "Malformed class id {!r}, the import will"
+                   " skip this row.".format(row[0]))
+    if course_rows and course_rows[0][1][0].startswith("Generic"):
+        report(course_rows[0][0], "Program starts with a generic row, which"
+               " has no course for substitutes to attach to.")
+
+    # Walk the rows the way the import does to build up the program
+    program_courses = {}
+    course_bounds = {}
+    specific = []
+    generic_substitutes = []
+    generics = []
+    parent = None
+    substitute = False
+    previous_generic = False
+    for line_number, row in course_rows:
+        course_id = row[0].strip()
+        generic = row[0].startswith("Generic")
+        elective = bool(row[-1])
+        if substitute and previous_generic:
+            report(line_number, "Substitute follows a generic row, the import"
+                   " will attach it to the course before that instead.")
+        if generic:
+            credit_type = generic_credit_type(course_id)
+            if credit_type is None:
+                report(line_number, "Can't tell the credit type of"
+                       " {!r}.".format(row[0]))
+            try:
+                generic_credits = parse_optional_float(row[2])
+            except ValueError:
+                report(line_number,
+                       "Can't read credits {!r}.".format(row[2]))
+                generic_credits = None
+            if substitute and parent is not None:
+                generic_substitutes.append((0, parent, credit_type,
+                                            generic_credits, elective))
+            elif not substitute:
+                generics.append((0, generic_credits, elective))
+        else:
+            try:
+                bounds = credit_bounds(row[2])
+            except ValueError:
+                bounds = (None, None)
+            if bounds == (None, None):
+                report(line_number,
+                       "Can't read credit range {!r}.".format(row[2]))
+            elif bounds[0] > bounds[1]:
+                report(line_number, "Credit range {!r} is backwards.".format(
+                    row[2]))
+            course_bounds[course_id] = bounds
+            outcomes = [int(outcome) for outcome in re.findall("[0-9]+",
+                                                               row[3])]
+            unknown = sorted(set(outcome for outcome in outcomes
+                                 if outcome not in clo_ids))
+            if unknown:
+                report(line_number, "Unknown CLO ids {}.".format(
+                    ", ".join(str(outcome) for outcome in unknown)))
+            if len(set(outcomes)) != len(outcomes):
+                report(line_number, "CLO ids {!r} list the same outcome more"
+                       " than once.".format(row[3]))
+            if substitute and parent is not None:
+                specific.append((0, parent, course_id))
+            else:
+                program_courses[course_id] = elective
+                parent = course_id
+        substitute = row[1].strip().endswith("or")
+        previous_generic = generic
+    if substitute:
+        report(course_rows[-1][0], "Last course ends in 'or' but nothing"
+               " follows it to substitute.")
+
+    if declared is not None:
+        totals = credits.compute_credits([(0, declared, elective_credits)],
+                                         {0:program_courses},
+                                         course_bounds,
+                                         specific,
+                                         generic_substitutes,
+                                         generics)[0]
+        # Courses without credits were already reported row by row above
+        for problem in totals["problems"]:
+            if not problem.startswith("No credits"):
+                report(ata_line_number, problem)
+    return issues
+
+def validate_file(programs_csv, clo_ids, processes=1):
+    """Validate the open .csv file and return every issue sorted by line.
+
+    Programs are checked in chunks across processes worker processes."""
+    programs, orphans = read_numbered_program_rows(programs_csv)
+    issues = [(line_number, ORPHAN_ROW) for line_number, row in orphans]
+    if not programs:
+        issues.append((1, NO_PROGRAMS))
+        return issues
+    # The import looks programs up by label, so they have to be unique
+    first_lines = {}
+    for program in programs:
+        line_number, ata = program[0]
+        label = ata[0]
+        if label in first_lines:
+            issues.append((line_number, "{}: Program already listed on line"
+                           " {}.".format(label.strip(), first_lines[label])))
+        else:
+            first_lines[label] = line_number
+    chunk_size = -(-len(programs) // max(processes, 1))
+    chunks = [programs[start:start + chunk_size]
+              for start in range(0, len(programs), chunk_size)]
+    if processes > 1 and len(chunks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        import django
+        with ProcessPoolExecutor(max_workers=processes,
+                                 initializer=django.setup) as pool:
+            results = pool.map(validate_programs, chunks,
+                               [clo_ids] * len(chunks))
+            for chunk_issues in results:
+                issues += chunk_issues
+    else:
+        for chunk in chunks:
+            issues += validate_programs(chunk, clo_ids)
+    return sorted(issues)
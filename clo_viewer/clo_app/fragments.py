@@ -0,0 +1,77 @@
+"""Prebuilt HTML for the big tables on the degree program page.
+
+The course by core learning outcome table and the similarity table have a row
+per course and per program, and rendering them through the template language
+costs a variable lookup, a cycle tag and an if tag per cell. Here we build the
+rows directly as strings, escaping every value the same way the template would,
+and keep the result in the cache keyed on the program and the data version so
+most requests don't build them at all.
+
+The data only changes when an import runs, and every import creates a new
+Catalog, so the newest catalog id is all the data version needs to be."""
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.template.defaultfilters import floatformat
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from . import models
+
+ROW_CLASSES = ("white_row", "gray_row")
+
+
+def data_version():
+    """Return a value that changes whenever imported data changes."""
+    return models.Catalog.objects.aggregate(latest=Max("id"))["latest"]
+
+def cache_key(name, *parts):
+    """Build a cache key for a fragment out of its name, parts identifying what
+    it shows and the current data version."""
+    return "fragment:{}:{}:{}".format(name,
+                                      ":".join(str(part) for part in parts),
+                                      data_version())
+
+def cell(value):
+    """Escape value as the template language would display it."""
+    return conditional_escape(localize(value))
+
+def course_rows(course_clo_pairs):
+    """Return the <tr> rows of the course by core learning outcome table.
+
+    course_clo_pairs - List of (course, [bool per core learning outcome])"""
+    rows = []
+    for number, (course, outcomes) in enumerate(course_clo_pairs):
+        rows.append(
+            '<tr class="{}"><td>{} </td><td>{}</td><td>{}</td>{}</tr>'.format(
+                ROW_CLASSES[number % 2],
+                cell(course.id),
+                cell(course.label),
+                cell(course.lower_credit_bound),
+                "".join("<td>X</td>" if outcome else "<td></td>"
+                        for outcome in outcomes)))
+    return mark_safe("\n".join(rows))
+
+def distance_rows(program_distances):
+    """Return the <tr> rows of the similarity table, most similar first.
+
+    program_distances - List of (program, percentage) sorted least similar
+    first, as the view builds it."""
+    rows = []
+    for number, (program, distance) in enumerate(reversed(program_distances)):
+        rows.append('<tr class="{}"><td>{}</td><td>{}%</td></tr>'.format(
+            ROW_CLASSES[number % 2],
+            cell(program.label),
+            floatformat(distance)))
+    return mark_safe("\n".join(rows))
+
+def cached(key, build):
+    """Return the cached value for key, calling build() to make and store it
+    if it isn't there. Keys carry the data version, so nothing needs to expire
+    by time."""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, None)
+    return value
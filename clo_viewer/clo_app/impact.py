@@ -0,0 +1,159 @@
+"""Which courses the most degree programs depend on, for a whole catalog.
+
+For every course we count the programs that list it (and how many of those
+require it), the programs that accept it as a substitute, the share of each
+program's credits it accounts for added up across programs, how many core
+learning outcomes it provides and how many times it's the only course in a
+program providing one of them. The last one is what tells you changing a course
+would cost some program an outcome.
+
+All of it comes out of one pass over the program incidence and substitution
+edges from clo_app.matrices, so the cost doesn't depend on how many queries a
+program would take through the ORM."""
+
+from django.db import transaction
+
+from . import models
+from . import matrices
+from . import catalogs
+
+# Columns the impact page and JSON can be sorted by, biggest first
+SORT_FIELDS = ("program_count",
+               "required_count",
+               "substitute_count",
+               "credit_reach",
+               "clo_count",
+               "clo_sole")
+
+
+def impact_inputs(program_queryset, catalog=None):
+    """Fetch everything compute_impact needs for the programs in
+    program_queryset, as plain Python values, with course credits and outcomes
+    as catalog gives them."""
+    programs = list(program_queryset.order_by("id").values_list("id",
+                                                                "credits"))
+    program_ids = [program_id for program_id, credits in programs]
+    program_courses = matrices.program_courses(program_ids)
+    specific, generic = matrices.substitute_edges(program_ids)
+    course_ids = set(course for program_id, parent, course in specific)
+    for courses in program_courses.values():
+        course_ids.update(courses)
+    course_credits = {course_id:lower for course_id, (label, lower, upper)
+                      in matrices.course_details(course_ids, catalog).items()}
+    course_outcomes = matrices.course_outcomes(course_ids, catalog)
+    return (programs, program_courses, specific, course_credits,
+            course_outcomes)
+
+def compute_impact(programs, program_courses, specific, course_credits,
+                   course_outcomes):
+    """Work out the impact figures for every course the programs touch.
+
+    programs - List of (program_id, credits)
+    program_courses - {program_id: {course_id: elective}}
+    specific - Substitution edges (program_id, parent_course_id, course_id)
+    course_credits - {course_id: lower_credit_bound}
+    course_outcomes - {course_id: bitmask}
+
+    Returns {course_id: dict of figures}."""
+    substitutes = {}
+    for program_id, parent, course in specific:
+        substitutes.setdefault(program_id, set()).add(course)
+
+    results = {}
+
+    def figures(course_id):
+        if course_id not in results:
+            results[course_id] = {
+                "program_count":0,
+                "required_count":0,
+                "substitute_count":0,
+                "credit_reach":0.0,
+                "clo_count":bin(course_outcomes.get(course_id, 0)).count("1"),
+                "clo_sole":0}
+        return results[course_id]
+
+    for program_id, declared in programs:
+        courses = program_courses.get(program_id, {})
+        # How many of the program's courses provide each outcome
+        providers = {}
+        for course_id, elective in courses.items():
+            course = figures(course_id)
+            course["program_count"] += 1
+            if not elective:
+                course["required_count"] += 1
+            mask = course_outcomes.get(course_id, 0)
+            while mask:
+                bit = mask & -mask
+                providers[bit] = providers.get(bit, 0) + 1
+                mask ^= bit
+        for course_id in courses:
+            mask = course_outcomes.get(course_id, 0)
+            while mask:
+                bit = mask & -mask
+                if providers[bit] == 1:
+                    figures(course_id)["clo_sole"] += 1
+                mask ^= bit
+        program_substitutes = substitutes.get(program_id, set())
+        for course_id in program_substitutes:
+            figures(course_id)["substitute_count"] += 1
+        if declared:
+            for course_id in program_substitutes.union(courses):
+                figures(course_id)["credit_reach"] += (
+                    (course_credits.get(course_id) or 0) / declared)
+    return results
+
+def catalog_impact_inputs(catalog):
+    """impact_inputs for every program in catalog."""
+    return impact_inputs(catalogs.programs_in(catalog), catalog)
+
+def publish_impact(catalog, results):
+    """Replace the saved CourseImpact rows for catalog with results."""
+    rows = [models.CourseImpact(catalog=catalog, course_id=course_id,
+                                **course)
+            for course_id, course in results.items()]
+    with transaction.atomic():
+        models.CourseImpact.objects.filter(catalog=catalog).delete()
+        models.CourseImpact.objects.bulk_create(rows)
+
+def catalog_impact(catalog, sort="program_count"):
+    """Return the CourseImpact rows for catalog, biggest sort first, with their
+    courses attached as catalog describes them. If the worker hasn't got to
+    the catalog yet we work them out on the spot without saving."""
+    if sort not in SORT_FIELDS:
+        sort = "program_count"
+    rows = list(models.CourseImpact.objects.filter(
+        catalog=catalog).select_related("course").order_by("-" + sort,
+                                                           "course_id"))
+    if not rows:
+        results = compute_impact(*catalog_impact_inputs(catalog))
+        courses = models.Course.objects.in_bulk(list(results))
+        rows = [models.CourseImpact(catalog=catalog, course=courses[course_id],
+                                    **course)
+                for course_id, course in results.items()]
+        rows.sort(key=lambda row: (-getattr(row, sort), row.course_id))
+    catalogs.describe_courses([row.course for row in rows], catalog)
+    return rows
+
+def course_impact(catalog, course_id):
+    """Return the CourseImpact for one course in catalog, or None if no program
+    in the catalog uses it."""
+    try:
+        row = models.CourseImpact.objects.select_related("course").get(
+            catalog=catalog, course_id=course_id)
+        catalogs.describe_courses([row.course], catalog)
+        return row
+    except models.CourseImpact.DoesNotExist:
+        pass
+    if models.CourseImpact.objects.filter(catalog=catalog).exists():
+        return None
+    for row in catalog_impact(catalog):
+        if row.course_id == course_id:
+            return row
+    return None
+
+def as_dict(row):
+    """Return a CourseImpact as a dictionary for the JSON endpoints."""
+    figures = {field:getattr(row, field) for field in SORT_FIELDS}
+    figures["course"] = row.course_id
+    figures["label"] = row.course.label
+    return figures
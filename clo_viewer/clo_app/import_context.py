@@ -0,0 +1,135 @@
+"""Lookups shared across one run of the degree program import.
+
+The same courses turn up in program after program, and every row names its
+core learning outcomes and credit types, so the import used to ask the
+database the same handful of questions over and over. An ImportContext loads
+the small reference tables once and keeps recently used courses, along with
+the outcomes already linked to them, in a least recently used cache. The cache
+has a fixed size so memory stays put however big the file is."""
+
+from collections import OrderedDict
+
+from . import models
+
+# Courses kept in memory at once, plenty for every course a program shares
+# with the ones imported just before it
+MAX_COURSES = 1000
+
+
+class ImportContext:
+    """Reference data and a bounded course cache for a single import into
+    catalog.
+
+    course_hits and course_misses count course lookups answered from the cache
+    and from the database, outcome_hits and outcome_misses the same for the
+    sets of outcomes linked to a course. skipped_saves counts course rows that
+    didn't need saving again."""
+
+    def __init__(self, catalog, max_courses=MAX_COURSES):
+        self.catalog = catalog
+        self.outcomes = models.CoreLearningOutcome.objects.in_bulk()
+        self.credit_types = models.CreditType.objects.in_bulk()
+        self.max_courses = max_courses
+        self.course_hits = 0
+        self.course_misses = 0
+        self.outcome_hits = 0
+        self.outcome_misses = 0
+        self.skipped_saves = 0
+        # course id -> {"course": Course or None, "outcomes": set of ids or None,
+        # "saved": True once this import has saved the course}
+        self._courses = OrderedDict()
+
+    def outcome(self, clo_id):
+        """Return the CoreLearningOutcome with id clo_id."""
+        try:
+            return self.outcomes[clo_id]
+        except KeyError:
+            raise models.CoreLearningOutcome.DoesNotExist(
+                "No core learning outcome {}.".format(clo_id))
+
+    def credit_type(self, label_short):
+        """Return the CreditType with the short label label_short."""
+        try:
+            return self.credit_types[label_short]
+        except KeyError:
+            raise models.CreditType.DoesNotExist(
+                "No credit type '{}'.".format(label_short))
+
+    def _entry(self, course_id):
+        """Return the cache entry for course_id, marking it most recently used
+        and making room for it if it's new."""
+        entry = self._courses.get(course_id)
+        if entry is None:
+            entry = {"course":None, "outcomes":None, "saved":False}
+            self._courses[course_id] = entry
+            if len(self._courses) > self.max_courses:
+                self._courses.popitem(last=False)
+        else:
+            self._courses.move_to_end(course_id)
+        return entry
+
+    def course(self, course_id):
+        """Return the Course with id course_id."""
+        entry = self._entry(course_id)
+        if entry["course"] is None:
+            self.course_misses += 1
+            entry["course"] = models.Course.objects.get(id=course_id)
+        else:
+            self.course_hits += 1
+        return entry["course"]
+
+    def remember_course(self, course):
+        """Put a Course that was just saved, along with this catalog's copy of
+        it, into the cache."""
+        entry = self._entry(course.id)
+        entry["course"] = course
+        entry["saved"] = True
+
+    def saved_course(self, course_id, label, lower_credit_bound,
+                     upper_credit_bound):
+        """Return the Course this import already saved with exactly label and
+        bounds, or None if it still needs saving."""
+        entry = self._courses.get(course_id)
+        if entry is None or not entry["saved"]:
+            return None
+        course = entry["course"]
+        if (course.label, course.lower_credit_bound,
+                course.upper_credit_bound) != (label, lower_credit_bound,
+                                               upper_credit_bound):
+            return None
+        self._courses.move_to_end(course_id)
+        self.course_hits += 1
+        self.skipped_saves += 1
+        return course
+
+    def course_outcome_ids(self, course_id):
+        """Return the set of core learning outcome ids linked to course_id in
+        the catalog being imported.
+
+        The set is the cached one, so add to it when linking another outcome
+        to keep it up to date."""
+        entry = self._entry(course_id)
+        if entry["outcomes"] is None:
+            self.outcome_misses += 1
+            entry["outcomes"] = set(
+                models.CourseLearningOutcome.objects.filter(
+                    catalog=self.catalog,
+                    course_id=course_id).values_list("learning_outcome_id",
+                                                     flat=True))
+        else:
+            self.outcome_hits += 1
+        return entry["outcomes"]
+
+    def summary(self):
+        """Describe how well the course cache did."""
+        lines = []
+        for name, hits, misses in (("course", self.course_hits,
+                                    self.course_misses),
+                                   ("outcome set", self.outcome_hits,
+                                    self.outcome_misses)):
+            lookups = hits + misses
+            lines.append("{} {} lookups, {} from the cache ({:.0%}).".format(
+                lookups, name, hits, hits / lookups if lookups else 0))
+        lines.append("{} unchanged course saves skipped.".format(
+            self.skipped_saves))
+        return "\n".join(lines)
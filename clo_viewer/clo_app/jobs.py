@@ -0,0 +1,105 @@
+"""A small job queue for rebuilding derived data, kept in the Job table.
+
+Every kind of job is split into three steps so the expensive part can run in a
+worker process without needing its own database connection:
+
+fetch(catalog) - Runs in the worker command, pulls what the job needs out of
+the database and returns it as a tuple of plain Python values.
+compute(*inputs) - Runs in the process pool, must be a module level function.
+publish(catalog, result) - Runs in the worker command again and saves the
+result in a single transaction, so the site keeps serving the old data until
+the new data is completely written."""
+
+from collections import namedtuple
+from django.db import transaction
+from django.utils import timezone
+
+from . import models
+from . import catalogs
+from . import credits
+from . import impact
+
+Task = namedtuple("Task", ["fetch", "compute", "publish"])
+
+TASKS = {
+    "catalog_snapshot":Task(catalogs.snapshot_inputs,
+                            catalogs.build_snapshot_data,
+                            catalogs.publish_snapshot),
+    "program_credits":Task(credits.catalog_credit_inputs,
+                           credits.compute_credits,
+                           credits.publish_credits),
+    "course_impact":Task(impact.catalog_impact_inputs,
+                         impact.compute_impact,
+                         impact.publish_impact),
+}
+
+
+def enqueue(kind, catalog=None):
+    """Ask for kind to be rebuilt for catalog and return the Job.
+
+    If the same rebuild is already waiting we return that one instead of
+    queueing a duplicate."""
+    if kind not in TASKS:
+        raise ValueError("Unknown job kind '{}'.".format(kind))
+    with transaction.atomic():
+        job = models.Job.objects.filter(kind=kind,
+                                        catalog=catalog,
+                                        status=models.Job.PENDING).first()
+        if job is None:
+            job = models.Job.objects.create(kind=kind, catalog=catalog)
+    return job
+
+def enqueue_rebuilds(catalog):
+    """Queue every kind of derived data rebuild for catalog."""
+    return [enqueue(kind, catalog) for kind in TASKS]
+
+def claim(limit):
+    """Mark up to limit pending jobs as running and return them, oldest first.
+
+    Each job is claimed with an UPDATE that only matches while it's still
+    pending, so two workers can never both end up with the same job."""
+    claimed = []
+    pending = models.Job.objects.filter(
+        status=models.Job.PENDING).order_by("id").values_list(
+            "id", flat=True)[:limit]
+    for job_id in list(pending):
+        won = models.Job.objects.filter(
+            id=job_id, status=models.Job.PENDING).update(
+                status=models.Job.RUNNING, started=timezone.now())
+        if won:
+            claimed.append(models.Job.objects.select_related(
+                "catalog").get(id=job_id))
+    return claimed
+
+def finish(job, error=None):
+    """Record that job is done, or that it failed with error."""
+    job.status = models.Job.FAILED if error else models.Job.DONE
+    job.error = error
+    job.finished = timezone.now()
+    job.save(update_fields=["status", "error", "finished"])
+
+def run_jobs(jobs, pool):
+    """Run the claimed jobs, doing the compute step in pool, and return how
+    many of them succeeded."""
+    running = []
+    for job in jobs:
+        task = TASKS.get(job.kind)
+        if task is None:
+            finish(job, "Unknown job kind '{}'.".format(job.kind))
+            continue
+        try:
+            inputs = task.fetch(job.catalog)
+        except Exception as error:
+            finish(job, repr(error))
+            continue
+        running.append((job, task, pool.submit(task.compute, *inputs)))
+    succeeded = 0
+    for job, task, future in running:
+        try:
+            task.publish(job.catalog, future.result())
+        except Exception as error:
+            finish(job, repr(error))
+            continue
+        finish(job)
+        succeeded += 1
+    return succeeded
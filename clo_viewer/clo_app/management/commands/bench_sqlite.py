@@ -0,0 +1,143 @@
+# Measure read throughput while an import is writing to the database
+
+"""
+
+This copies the database into a temporary directory once per configuration,
+then runs a writer thread that inserts courses in import-sized transactions
+while reader threads repeatedly run the query behind the degree program page.
+It reports how many reads completed per second and how many of them failed
+because the database was locked.
+
+The configurations compared are the SQLite defaults and the pragmas in
+settings.SQLITE_PRAGMAS with settings.SQLITE_JOURNAL_MODE. The copies are made with the backup API and thrown
+away afterwards, so the real database is never touched.
+
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import threading
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+READ_QUERY = ("SELECT c.id, c.label, clo.learning_outcome_id"
+              " FROM clo_app_dpcoursespecific dpcs"
+              " JOIN clo_app_course c ON c.id = dpcs.course_id"
+              " LEFT JOIN clo_app_courselearningoutcome clo"
+              " ON clo.course_id = c.id"
+              " WHERE dpcs.degree_program_id = ?")
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent reads during an import with and without the SQLite pragmas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, dest="readers", default=4)
+        parser.add_argument("--seconds", type=float, dest="seconds", default=5.0)
+        parser.add_argument("--batch", type=int, dest="batch", default=200,
+                            help="Rows the writer inserts per transaction.")
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES["default"]["NAME"]
+        # The journal mode is stored in the file, so put it back explicitly
+        configurations = [("defaults", {"journal_mode":"DELETE"}),
+                          ("tuned", dict(getattr(settings, "SQLITE_PRAGMAS",
+                                                 {}),
+                                         journal_mode=getattr(
+                                             settings, "SQLITE_JOURNAL_MODE",
+                                             "DELETE")))]
+        for name, pragmas in configurations:
+            workdir = tempfile.mkdtemp()
+            try:
+                path = os.path.join(workdir, "bench.sqlite3")
+                self.copy_database(source, path)
+                result = self.run_configuration(path, pragmas, options)
+            finally:
+                shutil.rmtree(workdir)
+            print("{:<9} {:9.0f} reads/s {:6d} locked {:7.0f} rows written/s".format(
+                name,
+                result["reads"] / options["seconds"],
+                result["locked"],
+                result["written"] / options["seconds"]))
+
+    def copy_database(self, source, path):
+        """Copy the database with SQLite's backup API, which also picks up
+        anything still sitting in the source's write-ahead log."""
+        source_connection = sqlite3.connect(source)
+        copy_connection = sqlite3.connect(path)
+        source_connection.backup(copy_connection)
+        copy_connection.close()
+        source_connection.close()
+
+    def connect(self, path, pragmas, read_only=False):
+        """Open a connection to path with pragmas applied."""
+        connection = sqlite3.connect(path, timeout=0.1,
+                                     check_same_thread=False)
+        for pragma, value in pragmas.items():
+            if pragma == "query_only" and not read_only:
+                continue
+            connection.execute("PRAGMA {} = {}".format(pragma, value))
+        if read_only:
+            connection.execute("PRAGMA query_only = ON")
+        return connection
+
+    def run_configuration(self, path, pragmas, options):
+        """Run the writer and readers against path for the configured time and
+        return the totals."""
+        # Set the journal mode up front since it's stored in the file
+        self.connect(path, pragmas).close()
+        program_ids = [row[0] for row in self.connect(path, {}).execute(
+            "SELECT id FROM clo_app_degreeprogram")] or [1]
+        stop = threading.Event()
+        totals = {"reads":0, "locked":0, "written":0}
+        lock = threading.Lock()
+
+        def writer():
+            connection = self.connect(path, pragmas)
+            number = 0
+            while not stop.is_set():
+                rows = [("BENCH {}".format(number + offset), "Bench course",
+                         5.0, 5.0)
+                        for offset in range(options["batch"])]
+                try:
+                    with connection:
+                        connection.executemany(
+                            "INSERT INTO clo_app_course (id, label,"
+                            " lower_credit_bound, upper_credit_bound)"
+                            " VALUES (?, ?, ?, ?)", rows)
+                except sqlite3.OperationalError:
+                    continue
+                number += options["batch"]
+                with lock:
+                    totals["written"] += options["batch"]
+            connection.close()
+
+        def reader(offset):
+            connection = self.connect(path, pragmas, read_only=True)
+            reads = locked = 0
+            index = offset
+            while not stop.is_set():
+                program_id = program_ids[index % len(program_ids)]
+                index += 1
+                try:
+                    connection.execute(READ_QUERY, (program_id,)).fetchall()
+                    reads += 1
+                except sqlite3.OperationalError:
+                    locked += 1
+            connection.close()
+            with lock:
+                totals["reads"] += reads
+                totals["locked"] += locked
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader, args=(offset,))
+                    for offset in range(options["readers"])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return totals
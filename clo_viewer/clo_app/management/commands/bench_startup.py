@@ -0,0 +1,96 @@
+# Measure how long a fresh worker takes to become useful
+
+"""
+
+Every autoscaled worker and every manage.py run pays for importing Django,
+every installed app and our own modules before it can do anything. This command
+starts a fresh Python process per measurement (so nothing is already imported)
+and times, for each settings module given:
+
+- setup: importing Django and running django.setup()
+- wsgi: getting the WSGI application, which loads middleware and URLs
+- first_request: serving one request through the WSGI application
+
+It prints the median of each over --repeat runs, so you can compare the default
+settings with the lean clo_viewer.settings_catalog_web profile.
+
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in the child process, prints one JSON line of timings
+CHILD_SCRIPT = """
+import os, sys, json, time, io
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+wsgi_done = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {"PATH_INFO":sys.argv[1], "HTTP_HOST":"localhost",
+           "wsgi.errors":io.StringIO()}
+setup_testing_defaults(environ)
+statuses = []
+body = b"".join(application(environ,
+                            lambda status, headers: statuses.append(status)))
+request_done = time.perf_counter()
+print(json.dumps({"setup":setup_done - start,
+                  "wsgi":wsgi_done - setup_done,
+                  "first_request":request_done - wsgi_done,
+                  "status":statuses[0],
+                  "modules":len(sys.modules)}))
+"""
+
+class Command(BaseCommand):
+    help = "Benchmark cold start time for one or more settings modules."
+
+    def add_arguments(self, parser):
+        parser.add_argument("settings_modules", nargs="*", type=str,
+                            default=["clo_viewer.settings",
+                                     "clo_viewer.settings_catalog_web"])
+        parser.add_argument("--repeat", type=int, dest="repeat", default=5)
+        parser.add_argument("--url", type=str, dest="url", default="/programs/")
+
+    def handle(self, *args, **options):
+        for settings_module in options["settings_modules"]:
+            runs = [self.run_child(settings_module, options["url"])
+                    for run in range(options["repeat"])]
+            print("{} ({} modules loaded, first request {})".format(
+                settings_module, runs[0]["modules"], runs[0]["status"]))
+            for phase in ("setup", "wsgi", "first_request"):
+                print("  {:<14} {:8.1f} ms".format(
+                    phase,
+                    statistics.median(run[phase] for run in runs) * 1000))
+            print("  {:<14} {:8.1f} ms".format(
+                "total",
+                statistics.median(run["setup"] + run["wsgi"]
+                                  + run["first_request"]
+                                  for run in runs) * 1000))
+
+    def run_child(self, settings_module, url):
+        """Time one cold start in a new interpreter and return its timings."""
+        environment = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+        result = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, url],
+                                cwd=settings.BASE_DIR,
+                                env=environment,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        if result.returncode != 0:
+            raise CommandError("Worker with {} failed to start:\n{}".format(
+                settings_module, result.stderr))
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        # Timing an error page would make a broken profile look fast
+        if not timings["status"].startswith("2"):
+            raise CommandError("The first request to {} with {} returned {}."
+                               " Is the database migrated?".format(
+                                   url, settings_module, timings["status"]))
+        return timings
@@ -0,0 +1,120 @@
+# Compare rendering the degree program tables through templates and prebuilt
+
+"""
+
+Builds --rows made up courses and programs (labels include characters that need
+escaping) and times three ways of producing the two big tables on the degree
+program page:
+
+- template: the nested {% for %}/{% if %}/{% cycle %} loops the page used to
+  render the tables with
+- prebuilt: fragments.course_rows and fragments.distance_rows
+- cached: fetching the prebuilt rows back out of the cache, which is what most
+  requests do
+
+It also checks that the template and prebuilt rows come out the same apart from
+whitespace between tags, so the fast path can't quietly drift from the markup.
+Nothing here touches the database.
+
+"""
+
+import re
+import time
+import statistics
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.template import engines
+from django.core.management.base import BaseCommand, CommandError
+
+from clo_app import fragments
+
+# The table loops exactly as degree_program.html had them
+TEMPLATE_TABLES = """
+    {% for course_clo_pair in course_clo_pairs %}
+    <tr class="{% cycle 'white_row' 'gray_row' %}">
+      <td>{{ course_clo_pair.0.id }} </td>
+      <td>{{ course_clo_pair.0.label }}</td>
+      <td>{{ course_clo_pair.0.lower_credit_bound }}</td>
+      {% for outcome in course_clo_pair.1 %}
+      {% if outcome %}
+      <td>X</td>
+      {% else %}
+      <td></td>
+      {% endif %}
+      {% endfor %}
+    </tr>
+    {% endfor %}
+  {% for program_distance in program_distances reversed %}
+  <tr class="{% cycle 'white_row' 'gray_row' %}">
+    <td>{{ program_distance.0.label }}</td>
+    <td>{{ program_distance.1 | floatformat}}%</td>
+  </tr>
+  {% endfor %}
+"""
+
+BETWEEN_TAGS = re.compile(r">\s+<")
+
+class Command(BaseCommand):
+    help = "Benchmark the degree program tables rendered by template and prebuilt."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, dest="rows", default=1000)
+        parser.add_argument("--repeat", type=int, dest="repeat", default=20)
+
+    def handle(self, *args, **options):
+        course_clo_pairs, program_distances = self.make_rows(options["rows"])
+        template = engines["django"].from_string(TEMPLATE_TABLES)
+        context = {"course_clo_pairs":course_clo_pairs,
+                   "program_distances":program_distances}
+
+        def prebuilt():
+            return (fragments.course_rows(course_clo_pairs)
+                    + "\n" + fragments.distance_rows(program_distances))
+
+        key = "fragment:bench_templates:{}".format(options["rows"])
+        cache.set(key, prebuilt(), None)
+        if self.normalize(template.render(context)) != self.normalize(prebuilt()):
+            raise CommandError("Prebuilt rows don't match the template output.")
+
+        timings = [("template", lambda: template.render(context)),
+                   ("prebuilt", prebuilt),
+                   ("cached", lambda: cache.get(key))]
+        print("{} courses and {} programs, median of {} runs".format(
+            options["rows"], options["rows"], options["repeat"]))
+        baseline = None
+        for name, render in timings:
+            median = self.time(render, options["repeat"])
+            baseline = baseline or median
+            print("  {:<9} {:9.2f} ms {:8.1f}x".format(name, median * 1000,
+                                                    baseline / median))
+        cache.delete(key)
+
+    def make_rows(self, count):
+        """Return made up (course_clo_pairs, program_distances) with count rows
+        each, shaped like the ones the degree program view builds."""
+        course_clo_pairs = []
+        for number in range(count):
+            course = SimpleNamespace(id="BENCH {}".format(number),
+                                     label="Course <{}> & lab".format(number),
+                                     lower_credit_bound=(number % 5) + 1.0)
+            course_clo_pairs.append(
+                (course, [(number >> bit) & 1 == 1 for bit in range(7)]))
+        program_distances = [
+            (SimpleNamespace(label="Program \"{}\" & co".format(number)),
+             number * 100 / count)
+            for number in range(count)]
+        return course_clo_pairs, program_distances
+
+    def normalize(self, html):
+        """Drop the whitespace between tags, which the template has plenty of
+        and the prebuilt rows don't."""
+        return BETWEEN_TAGS.sub("><", html.strip())
+
+    def time(self, render, repeat):
+        """Return the median time render() takes over repeat runs."""
+        runs = []
+        for run in range(repeat):
+            start = time.perf_counter()
+            render()
+            runs.append(time.perf_counter() - start)
+        return statistics.median(runs)
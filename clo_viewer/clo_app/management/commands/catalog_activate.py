@@ -0,0 +1,29 @@
+# Switch which catalog the site serves
+
+from django.core.management.base import BaseCommand, CommandError
+from clo_app import models
+from clo_app import catalogs
+
+class Command(BaseCommand):
+    help = "List the imported catalogs, or make one of them the active catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("catalog_id", nargs="?", type=int)
+
+    def handle(self, *args, **options):
+        active = catalogs.active_catalog()
+        if options["catalog_id"] is None:
+            for catalog in models.Catalog.objects.order_by("id"):
+                marker = "*" if catalog == active else " "
+                print("{} {} {} ({}, {})".format(marker, catalog.id,
+                                                 catalog.label,
+                                                 catalog.year or "no year",
+                                                 catalog.campus or "no campus"))
+            return
+        try:
+            catalog = models.Catalog.objects.get(id=options["catalog_id"])
+        except models.Catalog.DoesNotExist:
+            raise CommandError("There is no catalog with id {}.".format(
+                options["catalog_id"]))
+        catalogs.activate(catalog)
+        print("Catalog '{}' is now active.".format(catalog.label))
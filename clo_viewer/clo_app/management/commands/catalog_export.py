@@ -0,0 +1,220 @@
+# Export the catalog out of Django for the institutional research folks
+
+"""
+
+The only copy of the catalog lives in db.sqlite3 behind the ORM, which is
+awkward for anyone doing analytics in pandas, R or Spark. This command dumps
+every model to JSON Lines (one object per line, one file per model), including
+which catalog is active and the derived snapshots, credit totals and impact
+figures, and can additionally write the derived matrices that most analyses
+actually want:
+
+- program_course: degree program x course incidence, 1 if the course is part of
+  the program. program_course_elective marks the ones taken as electives.
+- course_clo: course x core learning outcome incidence.
+- Substitution edges, as indices into the course list.
+
+The matrices are for one catalog, the active one unless --catalog says
+otherwise, with courses and outcomes as that catalog describes them. The JSON
+Lines and Parquet tables cover every catalog. The matrices go into a single
+.npz (needs NumPy) or, for the columnar crowd, into Parquet files in coordinate
+form (needs pyarrow). Tables are streamed in chunks so memory use doesn't grow
+with the size of the catalog.
+
+"""
+
+import os
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management.base import BaseCommand, CommandError
+from clo_app import models
+from clo_app import catalogs
+from clo_app import matrices
+
+EXPORTED_MODELS = [models.Catalog,
+                   models.CoreLearningOutcome,
+                   models.CreditType,
+                   models.Course,
+                   models.CatalogCourse,
+                   models.CourseLearningOutcome,
+                   models.DegreeProgram,
+                   models.DPCourseSpecific,
+                   models.DPCourseGeneric,
+                   models.DPCourseSubstituteSpecific,
+                   models.DPCourseSubstituteGeneric,
+                   models.ActiveCatalog,
+                   models.CatalogSnapshot,
+                   models.ProgramCredits,
+                   models.CourseImpact]
+
+class Command(BaseCommand):
+    help = "Export the catalog to JSON Lines, and optionally NPZ or Parquet matrices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", nargs=1, type=str)
+        parser.add_argument("--format", action="append", dest="formats",
+                            choices=["jsonl", "npz", "parquet"],
+                            help="Output format, may be given more than once."
+                            " Defaults to jsonl.")
+        parser.add_argument("--chunk-size", type=int, dest="chunk_size",
+                            default=matrices.CHUNK_SIZE)
+        parser.add_argument("--catalog", type=int, dest="catalog",
+                            help="Catalog id for the npz matrices, defaults"
+                            " to the active catalog.")
+
+    def handle(self, *args, **options):
+        directory = options["directory"][0]
+        formats = options["formats"] or ["jsonl"]
+        chunk_size = options["chunk_size"]
+        catalog = catalogs.active_catalog()
+        if options["catalog"] is not None:
+            try:
+                catalog = models.Catalog.objects.get(id=options["catalog"])
+            except models.Catalog.DoesNotExist:
+                raise CommandError("There is no catalog with id {}.".format(
+                    options["catalog"]))
+        os.makedirs(directory, exist_ok=True)
+        if "jsonl" in formats:
+            for model in EXPORTED_MODELS:
+                count = self.export_jsonl(model, directory, chunk_size)
+                print("Wrote {} {} rows.".format(count, model.__name__))
+        if "npz" in formats:
+            self.export_npz(directory, catalog)
+            print("Wrote catalog.npz.")
+        if "parquet" in formats:
+            for model in EXPORTED_MODELS:
+                self.export_parquet(model, directory, chunk_size)
+            print("Wrote Parquet tables.")
+        print("Export finished.")
+
+    def export_jsonl(self, model, directory, chunk_size):
+        """Stream every row of model into <directory>/<table>.jsonl and return
+        the number of rows written."""
+        fields = matrices.model_fields(model)
+        path = os.path.join(directory, model._meta.db_table + ".jsonl")
+        count = 0
+        with open(path, "w") as outfile:
+            for row in matrices.iter_rows(model.objects.all(), fields,
+                                          chunk_size):
+                # The encoder takes care of Catalog.created
+                outfile.write(json.dumps(dict(zip(fields, row)),
+                                         separators=(",", ":"),
+                                         cls=DjangoJSONEncoder))
+                outfile.write("\n")
+                count += 1
+        return count
+
+    def export_npz(self, directory, catalog):
+        """Write the incidence matrices and substitution edges for the programs
+        in catalog to <directory>/catalog.npz."""
+        # NumPy is only needed here so don't make everyone else import it
+        try:
+            import numpy
+        except ImportError:
+            raise CommandError("The npz format requires NumPy to be installed.")
+        program_ids = list(catalogs.programs_in(catalog).order_by(
+            "id").values_list("id", flat=True))
+        incidence = matrices.program_courses(program_ids)
+        specific, generic = matrices.substitute_edges(program_ids)
+        if catalog is None:
+            course_ids = list(models.Course.objects.order_by(
+                "id").values_list("id", flat=True))
+        else:
+            # Every course the catalog describes, plus any its programs use
+            # that were imported before catalogs kept their own copies
+            course_ids = set(models.CatalogCourse.objects.filter(
+                catalog=catalog).values_list("course_id", flat=True))
+            for courses in incidence.values():
+                course_ids.update(courses)
+            for program_id, parent, course in specific:
+                course_ids.update((parent, course))
+            course_ids = sorted(course_ids)
+        clo_ids = list(models.CoreLearningOutcome.objects.order_by(
+            "id").values_list("id", flat=True))
+        program_index = {pid:index for index, pid in enumerate(program_ids)}
+        course_index = {cid:index for index, cid in enumerate(course_ids)}
+
+        program_course = numpy.zeros((len(program_ids), len(course_ids)),
+                                     dtype=numpy.uint8)
+        program_course_elective = numpy.zeros_like(program_course)
+        for program_id, courses in incidence.items():
+            for course_id, elective in courses.items():
+                cell = (program_index[program_id], course_index[course_id])
+                program_course[cell] = 1
+                program_course_elective[cell] = elective
+
+        course_clo = numpy.zeros((len(course_ids), len(clo_ids)),
+                                 dtype=numpy.uint8)
+        for course_id, mask in matrices.course_outcomes(course_ids,
+                                                        catalog).items():
+            for column, clo_id in enumerate(clo_ids):
+                if mask & matrices.outcome_bit(clo_id):
+                    course_clo[course_index[course_id], column] = 1
+
+        substitute_edges = numpy.array(
+            [(program_index[pid], course_index[parent], course_index[course])
+             for pid, parent, course in specific],
+            dtype=numpy.int32).reshape(-1, 3)
+        generic_edges = numpy.array(
+            [(program_index[pid], course_index[parent])
+             for pid, parent, *rest in generic],
+            dtype=numpy.int32).reshape(-1, 2)
+        numpy.savez_compressed(
+            os.path.join(directory, "catalog.npz"),
+            catalog_id=numpy.int32(catalog.id if catalog else 0),
+            program_ids=numpy.array(program_ids, dtype=numpy.int32),
+            course_ids=numpy.array(course_ids, dtype=str),
+            clo_ids=numpy.array(clo_ids, dtype=numpy.int32),
+            program_course=program_course,
+            program_course_elective=program_course_elective,
+            course_clo=course_clo,
+            substitute_edges=substitute_edges,
+            generic_substitute_edges=generic_edges,
+            generic_substitute_credit_types=numpy.array(
+                [edge[2] for edge in generic], dtype=str))
+
+    def export_parquet(self, model, directory, chunk_size):
+        """Stream every row of model into <directory>/<table>.parquet.
+
+        The join tables already are the incidence matrices and edge lists in
+        coordinate form, which is how columnar tools want them anyway."""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise CommandError("The parquet format requires pyarrow to be"
+                               " installed.")
+        arrow_types = {"AutoField":pyarrow.int64(),
+                       "IntegerField":pyarrow.int64(),
+                       "FloatField":pyarrow.float64(),
+                       "BooleanField":pyarrow.bool_(),
+                       "CharField":pyarrow.string(),
+                       "DateTimeField":pyarrow.timestamp("us", tz="UTC"),
+                       "TextField":pyarrow.string()}
+        concrete_fields = model._meta.concrete_fields
+        schema = pyarrow.schema(
+            [(field.attname,
+              arrow_types[(field.target_field if field.is_relation
+                           else field).get_internal_type()])
+             for field in concrete_fields])
+        fields = [field.attname for field in concrete_fields]
+        path = os.path.join(directory, model._meta.db_table + ".parquet")
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            chunk = []
+            for row in matrices.iter_rows(model.objects.all(), fields,
+                                          chunk_size):
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    writer.write_table(self.arrow_table(chunk, schema))
+                    chunk = []
+            if chunk:
+                writer.write_table(self.arrow_table(chunk, schema))
+
+    def arrow_table(self, chunk, schema):
+        """Turn a list of row tuples into a pyarrow Table with schema."""
+        import pyarrow
+        columns = zip(*chunk)
+        return pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type)
+             for column, field in zip(columns, schema)],
+            schema=schema)
@@ -0,0 +1,38 @@
+# Report degree programs whose courses don't add up to their declared credits
+
+from django.core.management.base import BaseCommand, CommandError
+from clo_app import models
+from clo_app import catalogs
+from clo_app import credits
+
+class Command(BaseCommand):
+    help = "Print the computed credit totals for every program in a catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--catalog", type=int, dest="catalog",
+                            help="Catalog id, defaults to the active catalog.")
+        parser.add_argument("--problems-only", action="store_true",
+                            dest="problems_only")
+
+    def handle(self, *args, **options):
+        catalog = catalogs.active_catalog()
+        if options["catalog"] is not None:
+            try:
+                catalog = models.Catalog.objects.get(id=options["catalog"])
+            except models.Catalog.DoesNotExist:
+                raise CommandError("There is no catalog with id {}.".format(
+                    options["catalog"]))
+        flagged = 0
+        program_credits = credits.catalog_credits(catalog)
+        for program, totals in program_credits:
+            problems = totals.problem_list()
+            flagged += bool(problems)
+            if options["problems_only"] and not problems:
+                continue
+            print("{} (declares {:g}, courses give {:g}-{:g})".format(
+                program.label, program.credits,
+                totals.total_lower, totals.total_upper))
+            for problem in problems:
+                print("    " + problem)
+        print("{} of {} programs have problems.".format(
+            flagged, len(program_credits)))
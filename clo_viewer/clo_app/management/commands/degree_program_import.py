@@ -42,10 +42,16 @@ place of each other so you have to account for that in the data structure too.
 
 """
 
+import os
 import re
-import csv
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from clo_app import models
+from clo_app import catalogs
+from clo_app import csv_import
+from clo_app import jobs
+from clo_app import sqlite
+from clo_app import import_context
 
 class Command(BaseCommand):
     help = "Import JD's manually cleaned .csv of the degree programs and their CLO."
@@ -54,6 +60,22 @@ class Command(BaseCommand):
         parser.add_argument("filepath", nargs=1, type=str)
         parser.add_argument("--initialize", action="store_true", dest="init")
         parser.add_argument("--delete", action="store_true", dest="delete")
+        # Each import lands in its own catalog, these describe it
+        parser.add_argument("--catalog", type=str, dest="catalog",
+                            help="Catalog label, defaults to the file name.")
+        parser.add_argument("--year", type=str, dest="year")
+        parser.add_argument("--campus", type=str, dest="campus")
+        parser.add_argument("--activate", action="store_true", dest="activate",
+                            help="Serve the new catalog once it's imported.")
+        parser.add_argument("--validate", action="store_true", dest="validate",
+                            help="Check the file for problems without"
+                            " importing anything.")
+        parser.add_argument("--processes", type=int, dest="processes",
+                            default=1,
+                            help="Processes to validate with.")
+        parser.add_argument("--course-cache", type=int, dest="course_cache",
+                            default=import_context.MAX_COURSES,
+                            help="Courses to keep in memory while importing.")
         
     def handle(self, *args, **options):
         if options["init"]:
@@ -73,70 +95,90 @@ class Command(BaseCommand):
                 print("Nope. Did you include the single quotes? Don't.")
             return "\n"
             
+        if options["validate"]:
+            self.validate(options["filepath"][0], options["processes"])
+            return
         with open(options["filepath"][0]) as programs_csv:
-            degree_programs = csv.reader(programs_csv)
-            next(degree_programs)
-            ATA_line = next(degree_programs)
-            if not ATA_line[0].startswith("ATA"):
-                raise Exception("Second line of .csv was not expected ATA line!")
-            degree_program_rows = []
-            while ATA_line:
-                program_rows, new_ATA_line = self.dp_rows(degree_programs, ATA_line)
-                program_rows.insert(0, ATA_line)
-                degree_program_rows.append(program_rows)
-                ATA_line = new_ATA_line
+            degree_program_rows = csv_import.read_degree_program_rows(
+                programs_csv)
             # On the first pass we construct Degree Programs and Courses
             # This requires an initialization pass to have already been run
             # TODO: Add code checking for the initialization pass and
             # raise error if not present.
-            try:
-                models.CoreLearningOutcome.objects.get(id=1)
-            except models.CoreLearningOutcome.DoesNotExist:
+            if not models.CoreLearningOutcome.objects.filter(id=1).exists():
                 raise ValueError("You need to run the initialization pass first with"
                                  " --initialize")
-                
-            dp_objects = []
-            course_objects = []
-            clo_objects = []
-            for dp_rowset in degree_program_rows:
-                # Check for "N.A." and correct it to null if found
-                try:
-                    float(dp_rowset[0][1])
-                except ValueError:
-                    dp_rowset[0][1] = None
-                try:
-                    float(dp_rowset[0][2])
-                except ValueError:
-                    dp_rowset[0][2] = None
-                dp = models.DegreeProgram(label=dp_rowset[0][0],
-                                          credits=dp_rowset[0][1],
-                                          elective_credits=dp_rowset[0][2])
-                dp_objects.append(dp)
-                course_object_set, clo_set = self.build_courses_from_rows(dp_rowset)
-                course_objects += course_object_set
-                clo_objects += clo_set
 
-            # Since we reference objects created previously in pass two
-            # we have to save the ones made in the first pass.
+            # Let readers carry on while we write, this sticks to the file
+            sqlite.set_journal_mode()
+            # Everything from creating the catalog to queueing its rebuilds
+            # happens in one transaction, so a file that fails partway through
+            # doesn't leave a half imported catalog behind
+            with transaction.atomic():
+                catalog = models.Catalog(
+                    label=(options["catalog"]
+                           or os.path.basename(options["filepath"][0])),
+                    year=options["year"],
+                    campus=options["campus"])
+                catalog.save()
+                context = import_context.ImportContext(catalog,
+                                                       options["course_cache"])
+
+                dp_objects = []
+                course_objects = []
+                clo_objects = []
+                for dp_rowset in degree_program_rows:
+                    # Check for "N.A." and correct it to null if found
+                    try:
+                        float(dp_rowset[0][1])
+                    except ValueError:
+                        dp_rowset[0][1] = None
+                    try:
+                        float(dp_rowset[0][2])
+                    except ValueError:
+                        dp_rowset[0][2] = None
+                    dp = models.DegreeProgram(catalog=catalog,
+                                              label=dp_rowset[0][0],
+                                              credits=dp_rowset[0][1],
+                                              elective_credits=dp_rowset[0][2])
+                    dp_objects.append(dp)
+                    course_object_set, clo_set = self.build_courses_from_rows(dp_rowset,
+                                                                          context)
+                    course_objects += course_object_set
+                    clo_objects += clo_set
 
-            [dp.save() for dp in dp_objects]
-            [course.save() for course in course_objects]
-            print("Degree Programs, Courses and Course Learning Outcomes saved!")
+                # Since we reference objects created previously in pass two
+                # we have to save the ones made in the first pass.
 
-            self.pass_two(degree_program_rows)
-            print("Course relationships saved!")
-            print("Data imported.")
+                [dp.save() for dp in dp_objects]
+                [course.save() for course in course_objects]
+                print("Degree Programs, Courses and Course Learning Outcomes saved!")
+
+                self.pass_two(degree_program_rows, catalog, context)
+                print("Course relationships saved!")
+                print(context.summary())
+                # Snapshots and the like are rebuilt by the worker command so the
+                # import doesn't have to wait on them
+                jobs.enqueue_rebuilds(catalog)
+                print("Derived data rebuilds queued, run the worker command to"
+                      " build them.")
+            if options["activate"] or catalogs.active_catalog() is None:
+                catalogs.activate(catalog)
+                print("Catalog '{}' is now active.".format(catalog.label))
+            print("Data imported into catalog {}.".format(catalog.id))
             
-    def pass_two(self, degree_program_rows):
+    def pass_two(self, degree_program_rows, catalog, context):
         """On the second pass we construct Degree Program and Course
         Relationships."""
-        class_id_re = re.compile("[A-Z]+&* [0-9]+")
         for dp_rowset in enumerate(degree_program_rows):
-            degree_program = models.DegreeProgram.objects.get(label=dp_rowset[1][0][0])
+            degree_program = models.DegreeProgram.objects.get(
+                catalog=catalog,
+                label=dp_rowset[1][0][0])
             last_parent = (dp_rowset[0], 1)
             # Check to make sure first course in program isn't generic
             # If it is, change it
-            if dp_rowset[1][1][0].startswith("Generic"):
+            if (len(dp_rowset[1]) > 1
+                    and dp_rowset[1][1][0].startswith("Generic")):
                 for course_row in enumerate(dp_rowset[1]):
                     if course_row[1][0].startswith("ATA"):
                         continue
@@ -146,19 +188,23 @@ class Command(BaseCommand):
                     
             substitute = False
             for row in enumerate(dp_rowset[1]):
-                if not class_id_re.fullmatch(row[1][0].strip()):
+                # Generic rows have no class ID but still belong to the
+                # program
+                if not csv_import.is_course_row(row[1]):
                     continue
+                generic = row[1][0].startswith("Generic")
                 course_id = row[1][0]
                 course_title = row[1][1]
                 course_credits = row[1][2]
-                
-                course = models.Course.objects.get(id=course_id)
-                # Set flags on elective, substitute, and generic
+
+                # Set flags on elective and substitute
                 elective = bool(row[1][-1])
-                generic = course_id.startswith("Generic")
-                # Get parent course
-                parent = degree_program_rows[last_parent[0]][last_parent[1]]
-                parent_course = models.Course.objects.get(id=parent[0])
+                # Generic rows have no Course, and only substitutes need the
+                # parent's
+                course = None if generic else context.course(course_id)
+                if substitute:
+                    parent = degree_program_rows[last_parent[0]][last_parent[1]]
+                    parent_course = context.course(parent[0])
                 if not substitute and not generic:
                     dpcs = models.DPCourseSpecific(
                         degree_program=degree_program,
@@ -167,11 +213,12 @@ class Command(BaseCommand):
                     dpcs.save()
                     last_parent = (dp_rowset[0], row[0])
                 elif generic and not substitute:
-                    credit_type = self.extract_generic_credit_type(row[1])
+                    credit_type = self.extract_generic_credit_type(row[1],
+                                                                   context)
                     dpcg = models.DPCourseGeneric(
                         degree_program=degree_program,
                         credit_type=credit_type,
-                        credits=course_credits,
+                        credits=csv_import.parse_optional_float(course_credits),
                         elective=elective)
                     dpcg.save()
                     # Omission of last parent update purposeful
@@ -190,11 +237,12 @@ class Command(BaseCommand):
                     dp_parent_course = models.DPCourseSpecific.objects.get(
                         degree_program=degree_program,
                         course=parent_course)
-                    credit_type = self.extract_generic_credit_type(row[1])
+                    credit_type = self.extract_generic_credit_type(row[1],
+                                                                   context)
                     dpcsg = models.DPCourseSubstituteGeneric(
                         parent_course=dp_parent_course,
                         credit_type=credit_type,
-                        credits=course_credits,
+                        credits=csv_import.parse_optional_float(course_credits),
                         elective=elective)
                     dpcsg.save()
                 else:
@@ -207,24 +255,29 @@ class Command(BaseCommand):
                 
                                                            
 
-    def extract_generic_credit_type(self, course_row):
+    def extract_generic_credit_type(self, course_row, context):
         """Given a course row, extract and return its generic credit type."""
-        course_id = row[0]
-        credit_type_res = {re.compile("Communication"):"CS",
-                           re.compile("Natural Science"):"NS",
-                           re.compile("Humanities"):"H",
-                           re.compile("Performance"):"HP",
-                           re.compile("Social"):"SS",
-                           re.compile("Lab"):"NSL",
-                           re.compile("Quant"):"QS",
-                           re.compile("Elective"):"E",
-                           re.compile("Diversity"):"DC",
-                           re.compile("Prereq"):"PR"}
-        for credit_type_re in credit_type_res:
-            if credit_type_re.search(course_id):
-                type_string = credit_type_res[credit_type_re]
-                credit_type = models.CreditType.objects.get(label_short=type_string)
-                return credit_type
+        type_string = csv_import.generic_credit_type(course_row[0])
+        if type_string is None:
+            raise ValueError("Can't tell the credit type of {!r}.".format(
+                course_row[0]))
+        return context.credit_type(type_string)
+
+    def validate(self, filepath, processes):
+        """Check the file for problems and report them without touching the
+        database."""
+        clo_ids = list(models.CoreLearningOutcome.objects.values_list(
+            "id", flat=True))
+        if not clo_ids:
+            # Same outcomes the initialization pass creates
+            clo_ids = list(range(1, 8))
+        with open(filepath) as programs_csv:
+            issues = csv_import.validate_file(programs_csv, clo_ids, processes)
+        for line_number, message in issues:
+            print("Line {}: {}".format(line_number, message))
+        if issues:
+            raise CommandError("Found {} problems.".format(len(issues)))
+        print("No problems found.")
             
     def initialize(self):
         """Run an initialization pass if the user requests it. This is necessary
@@ -328,6 +381,9 @@ class Command(BaseCommand):
     def delete_all(self):
         """Delete every object in the database. This is so you can reseed it.
         Mostly just for debugging."""
+        models.ActiveCatalog.objects.all().delete()
+        models.Catalog.objects.all().delete()
+        models.CatalogCourse.objects.all().delete()
         models.CourseLearningOutcome.objects.all().delete()
         #models.CoreLearningOutcome.objects.all().delete()
         #models.CreditType.objects.all().delete()
@@ -338,71 +394,50 @@ class Command(BaseCommand):
         models.DPCourseSubstituteSpecific.objects.all().delete()
         models.DPCourseSubstituteGeneric.objects.all().delete()
         
-    def dp_rows(self, csv_reader, ATA_line):
-        """Extract the rows corresponding to a particular degree program and return 
-        them.
-
-        csv_reader - The CSV reader that returns rows from the data to be imported.
-        ATA_line - The degree program line that was previously read."""
-        rows = []
-        # Compile a regular expression pattern matching class ID's
-        class_id_re = re.compile("[A-Z]+&* [0-9]+")
-        for row in csv_reader:
-            # Exit when we encounter the next ATA row after first
-            if row[0].startswith("ATA"):
-                return (rows, row)
-            elif class_id_re.fullmatch(row[0].strip()):
-                rows.append(row)
-            elif row[0].startswith("Generic"):
-                rows.append(row)
-        # This exit point occurs when we run out of rows to read
-        return (rows, None)
-
-    def build_courses_from_rows(self, rowset):
+    def build_courses_from_rows(self, rowset, context):
         """Take a set of rows from the .csv, and construct course objects from 
         them. Next we construct CourseLearningOutcomes. Then return both."""
-        class_id_re = re.compile("[A-Z]+&* [0-9]+")
         courses = []
         course_learning_outcomes = []
         for row in rowset:
-            if not class_id_re.fullmatch(row[0].strip()):
+            if not csv_import.CLASS_ID_RE.fullmatch(row[0].strip()):
                 continue
-            # If credit is numeric assign it to lower and upper credit bound
-            # Otherwise, split the credit range and assign
-            try:
-                lowercb = float(row[2])
-                uppercb = float(row[2])
-            except ValueError:
-                if "-" in row[2]:
-                    bounds = row[2].split("-")
-                    lowercb = float(bounds[0])
-                    uppercb = float(bounds[1])
-                else:
-                    lowercb = None
-                    uppercb = None
-                    
-            course = models.Course(id=row[0].strip(),
-                                   label=row[1].strip(" or"),
-                                   lower_credit_bound=lowercb,
-                                   upper_credit_bound=uppercb)
-            course.save()
+            lowercb, uppercb = csv_import.credit_bounds(row[2])
+            course_id = row[0].strip()
+            label = row[1].strip(" or")
+
+            # Courses shared between programs usually come up again with the
+            # same label and credits, and then there's nothing to save
+            course = context.saved_course(course_id, label, lowercb, uppercb)
+            if course is None:
+                course = models.Course(id=course_id,
+                                       label=label,
+                                       lower_credit_bound=lowercb,
+                                       upper_credit_bound=uppercb)
+                course.save()
+                # The Course row is shared, what this catalog says about the
+                # course is kept separately so older catalogs keep theirs
+                models.CatalogCourse.objects.update_or_create(
+                    catalog=context.catalog,
+                    course=course,
+                    defaults={"label":course.label,
+                              "lower_credit_bound":lowercb,
+                              "upper_credit_bound":uppercb})
+                context.remember_course(course)
 
             outcome_string = row[3]
             clo_content = re.findall("[0-9]+", outcome_string)
+            linked_outcomes = context.course_outcome_ids(course.id)
             for outcome in clo_content:
-                core_learning_outcome = models.CoreLearningOutcome.objects.get(
-                    id=int(
-                        outcome))
-                try:
-                    models.CourseLearningOutcome.objects.get(
-                        course=course,
-                        learning_outcome=core_learning_outcome)
-                    break
-                except models.CourseLearningOutcome.DoesNotExist:
-                    course_learning_outcome = models.CourseLearningOutcome(
-                        course=course,
-                        learning_outcome=core_learning_outcome)
-                    course_learning_outcome.save()
+                core_learning_outcome = context.outcome(int(outcome))
+                if core_learning_outcome.id in linked_outcomes:
+                    continue
+                course_learning_outcome = models.CourseLearningOutcome(
+                    catalog=context.catalog,
+                    course=course,
+                    learning_outcome=core_learning_outcome)
+                course_learning_outcome.save()
+                linked_outcomes.add(core_learning_outcome.id)
                 
         return (courses, course_learning_outcomes)
          
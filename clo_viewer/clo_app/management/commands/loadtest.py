@@ -0,0 +1,401 @@
+# Measure how many requests per second the site sustains and how fast it answers
+
+"""
+
+Sends a weighted mix of requests at the site from --concurrency threads for
+--seconds and reports throughput, error rate and p50/p95/p99 latency, overall
+and per URL. There are three ways to point it at the site:
+
+- by default requests go straight into clo_viewer.wsgi.application in this
+  process, which measures Django and the database without any HTTP in the way
+- --serve starts a threaded wsgiref server on a local port (--port, 0 picks a
+  free one) and sends real HTTP requests at it
+- --base-url sends HTTP requests at a server that is already running
+
+The mix is given as --mix <url name>=<weight> with the names from
+clo_app/urls.py, e.g. --mix degree-program=5 --mix clo=3. Without any --mix
+every page gets the weight in DEFAULT_WEIGHTS. Pages that need ids (a program,
+an outcome, a course...) get up to --samples different ones picked from the
+active catalog, so the run doesn't just hit one cached page over and over.
+
+--output saves the report as JSON. --compare old.json new.json diffs two saved
+reports instead of running anything. --slo-p95 and --max-error-rate (and
+--max-regression when comparing) make the command fail when they're missed, so
+it can gate a deploy.
+
+"""
+
+import io
+import json
+import math
+import time
+import random
+import threading
+import socketserver
+import urllib.parse
+import urllib.error
+import urllib.request
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+from wsgiref.util import setup_testing_defaults
+from django.db import connections
+from django.urls import reverse
+from django.core.management.base import BaseCommand, CommandError
+
+from clo_app import models
+from clo_app import catalogs
+from clo_app import urls
+
+# How often each page is requested relative to the others when no --mix is
+# given. The program and outcome pages are what people actually browse.
+DEFAULT_WEIGHTS = {"degree-program":5,
+                   "clo":3,
+                   "programs":2,
+                   "outcomes":1,
+                   "home":1,
+                   "about":1,
+                   "degree-program-diff":1,
+                   "compare":1,
+                   "credit-audit":1,
+                   "course-impact":1,
+                   "course-impact-json":1,
+                   "course-impact-lookup":1}
+
+PERCENTILES = (50, 95, 99)
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(ordered, percent):
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def summarize(results, seconds):
+    """Turn a list of (url name, seconds taken, ok) into report figures."""
+    latencies = sorted(taken * 1000 for name, taken, ok in results)
+    errors = sum(1 for name, taken, ok in results if not ok)
+    summary = {"requests":len(results),
+               "errors":errors,
+               "error_rate":errors / len(results) if results else 0,
+               "throughput":len(results) / seconds if seconds else 0}
+    for percent in PERCENTILES:
+        summary["p{}".format(percent)] = percentile(latencies, percent)
+    summary["max"] = latencies[-1] if latencies else None
+    return summary
+
+class Command(BaseCommand):
+    help = "Load test the site and report throughput and latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mix", action="append", dest="mix", default=[],
+                            help="<url name>=<weight>, may be repeated.")
+        parser.add_argument("--concurrency", type=int, dest="concurrency",
+                            default=4)
+        parser.add_argument("--seconds", type=float, dest="seconds",
+                            default=10.0)
+        parser.add_argument("--samples", type=int, dest="samples", default=20,
+                            help="Different ids to use per page.")
+        parser.add_argument("--seed", type=int, dest="seed", default=0)
+        parser.add_argument("--serve", action="store_true", dest="serve",
+                            help="Serve the site on a local port and load"
+                            " test it over HTTP.")
+        parser.add_argument("--port", type=int, dest="port", default=0)
+        parser.add_argument("--base-url", type=str, dest="base_url",
+                            help="Load test an already running server.")
+        parser.add_argument("--output", type=str, dest="output",
+                            help="Save the report to this JSON file.")
+        parser.add_argument("--compare", nargs=2, dest="compare",
+                            metavar=("OLD", "NEW"),
+                            help="Compare two saved reports instead of"
+                            " running.")
+        parser.add_argument("--slo-p95", type=float, dest="slo_p95",
+                            help="Fail if overall p95 latency is over this"
+                            " many milliseconds.")
+        parser.add_argument("--max-error-rate", type=float,
+                            dest="max_error_rate",
+                            help="Fail if more than this fraction of requests"
+                            " fail.")
+        parser.add_argument("--max-regression", type=float,
+                            dest="max_regression",
+                            help="With --compare, fail if p95 latency or"
+                            " throughput got worse by more than this"
+                            " percentage.")
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            self.compare(*options["compare"], options=options)
+            return
+        if options["serve"] and options["base_url"]:
+            raise CommandError("Use either --serve or --base-url, not both.")
+        mix = self.build_mix(self.parse_weights(options["mix"]),
+                             options["samples"],
+                             random.Random(options["seed"]))
+
+        server = None
+        if options["base_url"]:
+            target = options["base_url"].rstrip("/")
+            send = self.send_http(target)
+        else:
+            from clo_viewer.wsgi import application
+            if options["serve"]:
+                server = make_server("127.0.0.1", options["port"], application,
+                                     server_class=ThreadingWSGIServer,
+                                     handler_class=QuietHandler)
+                threading.Thread(target=server.serve_forever,
+                                 daemon=True).start()
+                target = "http://127.0.0.1:{}".format(server.server_port)
+                send = self.send_http(target)
+            else:
+                target = "in-process"
+                send = self.send_wsgi(application)
+        try:
+            # One pass over every url first so nothing is measured cold
+            for name, path, weight in mix:
+                send(path)
+            results, seconds = self.run(mix, send, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        report = {"target":target,
+                  "concurrency":options["concurrency"],
+                  "seconds":seconds,
+                  "overall":summarize(results, seconds),
+                  "urls":{}}
+        for name in sorted(set(name for name, path, weight in mix)):
+            report["urls"][name] = summarize(
+                [result for result in results if result[0] == name], seconds)
+        self.print_report(report)
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(report, output_file, indent=2)
+                output_file.write("\n")
+            print("Saved report to {}.".format(options["output"]))
+        self.check_slo(report["overall"], options)
+
+    def parse_weights(self, mix):
+        """Turn the --mix arguments into {url name: weight}."""
+        names = [pattern.name for pattern in urls.urlpatterns]
+        if not mix:
+            return {name:DEFAULT_WEIGHTS.get(name, 1) for name in names}
+        weights = {}
+        for entry in mix:
+            name, separator, weight = entry.partition("=")
+            if name not in names:
+                raise CommandError("Unknown url name '{}', pick from: {}".format(
+                    name, ", ".join(names)))
+            try:
+                weights[name] = float(weight) if separator else 1.0
+            except ValueError:
+                raise CommandError("Bad weight in --mix {}.".format(entry))
+        return weights
+
+    def sample_values(self, catalog):
+        """Return {url argument: list of values} to fill the urls in with,
+        taken from catalog."""
+        programs = catalogs.programs_in(catalog)
+        return {"pid":list(programs.values_list("id", flat=True)),
+                "clo_id":list(models.CoreLearningOutcome.objects.values_list(
+                    "id", flat=True)),
+                "catalog_id":list(models.Catalog.objects.values_list(
+                    "id", flat=True)),
+                "course_id":list(models.DPCourseSpecific.objects.filter(
+                    degree_program__in=programs).values_list(
+                        "course_id", flat=True).distinct())}
+
+    def build_mix(self, weights, samples, chooser):
+        """Return [(url name, path, weight)] with the weight of every url name
+        split evenly over its sample paths."""
+        values = self.sample_values(catalogs.active_catalog())
+        patterns = {pattern.name:pattern for pattern in urls.urlpatterns}
+        mix = []
+        for name, weight in weights.items():
+            arguments = list(patterns[name].pattern.regex.groupindex)
+            missing = [argument for argument in arguments
+                       if not values.get(argument)]
+            if missing:
+                print("Skipping {}, nothing to fill in {} with.".format(
+                    name, ", ".join(missing)))
+                continue
+            paths = set()
+            for sample in range(samples if arguments else 1):
+                paths.add(reverse(name, kwargs={
+                    argument:chooser.choice(values[argument])
+                    for argument in arguments}))
+            for path in sorted(paths):
+                if name == "compare":
+                    path += "?programs=" + ",".join(
+                        str(pid) for pid in values["pid"][:3])
+                mix.append((name, path, weight / len(paths)))
+        if not mix:
+            raise CommandError("Nothing to request, import a catalog first.")
+        return mix
+
+    def send_wsgi(self, application):
+        """Return a function that requests a path from application in-process
+        and returns whether it succeeded."""
+        def send(path):
+            path, separator, query = path.partition("?")
+            # WSGI servers hand over the path already unquoted, as bytes
+            # squeezed into a latin-1 string
+            environ = {"PATH_INFO":urllib.parse.unquote_to_bytes(path).decode(
+                "iso-8859-1"),
+                       "QUERY_STRING":query,
+                       "HTTP_HOST":"localhost",
+                       "wsgi.errors":io.StringIO()}
+            setup_testing_defaults(environ)
+            statuses = []
+            response = application(
+                environ, lambda status, headers: statuses.append(status))
+            try:
+                for chunk in response:
+                    pass
+            finally:
+                if hasattr(response, "close"):
+                    response.close()
+            return int(statuses[0].split()[0]) < 400
+        return send
+
+    def send_http(self, base_url):
+        """Return a function that requests a path from the server at base_url
+        and returns whether it succeeded."""
+        def send(path):
+            try:
+                with urllib.request.urlopen(base_url + path,
+                                            timeout=30) as response:
+                    response.read()
+                    return response.status < 400
+            except (urllib.error.URLError, OSError):
+                return False
+        return send
+
+    def run(self, mix, send, options):
+        """Send requests from the mix for the configured time and return
+        ([(url name, seconds taken, ok)], seconds the run took)."""
+        names = [name for name, path, weight in mix]
+        paths = [path for name, path, weight in mix]
+        weights = [weight for name, path, weight in mix]
+        results = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + options["seconds"]
+
+        def worker(number):
+            chooser = random.Random(options["seed"] + number)
+            mine = []
+            try:
+                while time.perf_counter() < deadline:
+                    index = chooser.choices(range(len(paths)), weights)[0]
+                    began = time.perf_counter()
+                    try:
+                        ok = send(paths[index])
+                    except Exception:
+                        ok = False
+                    mine.append((names[index], time.perf_counter() - began,
+                                 ok))
+            finally:
+                connections.close_all()
+            with lock:
+                results.extend(mine)
+
+        threads = [threading.Thread(target=worker, args=(number,))
+                   for number in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
+
+    def print_report(self, report):
+        print("{} with {} threads for {:.1f}s".format(
+            report["target"], report["concurrency"], report["seconds"]))
+        print("{:<22} {:>8} {:>9} {:>7} {:>8} {:>8} {:>8}".format(
+            "url", "requests", "req/s", "errors", "p50 ms", "p95 ms", "p99 ms"))
+        rows = [("overall", report["overall"])] + sorted(
+            report["urls"].items())
+        for name, summary in rows:
+            if not summary["requests"]:
+                continue
+            print("{:<22} {:8d} {:9.1f} {:6.1%} {:8.1f} {:8.1f} {:8.1f}".format(
+                name, summary["requests"], summary["throughput"],
+                summary["error_rate"], summary["p50"], summary["p95"],
+                summary["p99"]))
+
+    def check_slo(self, overall, options):
+        """Raise CommandError if the run missed a target it was given."""
+        failures = []
+        if (options["slo_p95"] is not None and overall["p95"] is not None
+                and overall["p95"] > options["slo_p95"]):
+            failures.append("p95 latency {:.1f} ms is over {:g} ms".format(
+                overall["p95"], options["slo_p95"]))
+        if (options["max_error_rate"] is not None
+                and overall["error_rate"] > options["max_error_rate"]):
+            failures.append("error rate {:.2%} is over {:.2%}".format(
+                overall["error_rate"], options["max_error_rate"]))
+        if failures:
+            raise CommandError("Missed targets: {}.".format(
+                "; ".join(failures)))
+
+    def compare(self, old_path, new_path, options):
+        """Print how every figure moved between two saved reports."""
+        reports = []
+        for path in (old_path, new_path):
+            try:
+                with open(path) as report_file:
+                    reports.append(json.load(report_file))
+            except (OSError, ValueError) as error:
+                raise CommandError("Can't read report {}: {}".format(
+                    path, error))
+        old, new = reports
+        print("{:<22} {:<10} {:>10} {:>10} {:>8}".format(
+            "url", "figure", "old", "new", "change"))
+        rows = [("overall", old["overall"], new["overall"])]
+        rows += [(name, old["urls"][name], new["urls"][name])
+                 for name in sorted(set(old["urls"]) & set(new["urls"]))]
+        for name, before, after in rows:
+            for figure in ("throughput", "error_rate", "p50", "p95", "p99"):
+                print("{:<22} {:<10} {:>10} {:>10} {:>8}".format(
+                    name, figure, self.format_figure(before[figure]),
+                    self.format_figure(after[figure]),
+                    self.format_change(before[figure], after[figure])))
+        for name in sorted(set(old["urls"]) ^ set(new["urls"])):
+            print("{} is only in {}.".format(
+                name, old_path if name in old["urls"] else new_path))
+
+        if options["max_regression"] is not None:
+            limit = options["max_regression"]
+            failures = []
+            slower = self.change(old["overall"]["p95"], new["overall"]["p95"])
+            if slower is not None and slower > limit:
+                failures.append("p95 latency up {:.1f}%".format(slower))
+            lost = self.change(old["overall"]["throughput"],
+                               new["overall"]["throughput"])
+            if lost is not None and -lost > limit:
+                failures.append("throughput down {:.1f}%".format(-lost))
+            if failures:
+                raise CommandError("Regressed more than {:g}%: {}.".format(
+                    limit, "; ".join(failures)))
+        self.check_slo(new["overall"], options)
+
+    def change(self, before, after):
+        """Return the percentage change from before to after, or None if it
+        can't be worked out."""
+        if before is None or after is None or before == 0:
+            return None
+        return (after - before) / before * 100
+
+    def format_figure(self, value):
+        return "-" if value is None else "{:.4g}".format(value)
+
+    def format_change(self, before, after):
+        change = self.change(before, after)
+        return "-" if change is None else "{:+.1f}%".format(change)
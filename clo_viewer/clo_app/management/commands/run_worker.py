@@ -0,0 +1,84 @@
+# Process the derived data rebuilds queued by imports
+
+"""
+
+Imports only queue up the expensive rebuilds (catalog snapshots and so on) in
+the Job table so they can return right away. This command works through that
+queue, fetching each job's data here and doing the number crunching in a pool
+of processes. Results are published one transaction at a time, so the site
+carries on serving the previous version until the new one is in place.
+
+Run it with --once from cron or after an import to drain the queue and exit, or
+without it to keep polling. --enqueue queues every rebuild for the catalogs
+given, or for all of them, before starting, which is how catalogs imported
+before a kind of derived data existed get it built.
+
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from clo_app import models
+from clo_app import jobs
+from clo_app import sqlite
+
+class Command(BaseCommand):
+    help = "Run queued derived data rebuilds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, dest="processes",
+                            default=2)
+        parser.add_argument("--once", action="store_true", dest="once",
+                            help="Exit when the queue is empty.")
+        parser.add_argument("--poll", type=float, dest="poll", default=5.0,
+                            help="Seconds to wait between checks of an empty"
+                            " queue.")
+        parser.add_argument("--retry-stuck", action="store_true",
+                            dest="retry_stuck",
+                            help="Put jobs left running by a dead worker back"
+                            " in the queue first.")
+        parser.add_argument("--enqueue", nargs="*", type=int, dest="enqueue",
+                            metavar="CATALOG",
+                            help="Queue every rebuild for these catalog ids,"
+                            " or for every catalog if none are given, first.")
+
+    def handle(self, *args, **options):
+        # Publishing shouldn't lock the site's readers out
+        sqlite.set_journal_mode()
+        if options["retry_stuck"]:
+            stuck = models.Job.objects.filter(
+                status=models.Job.RUNNING).update(status=models.Job.PENDING)
+            print("Requeued {} stuck jobs.".format(stuck))
+        if options["enqueue"] is not None:
+            self.enqueue(options["enqueue"])
+        # Don't let the pool processes inherit our SQLite connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["processes"],
+                                 initializer=django.setup) as pool:
+            while True:
+                claimed = jobs.claim(options["processes"])
+                if not claimed:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+                succeeded = jobs.run_jobs(claimed, pool)
+                print("Ran {} jobs, {} failed.".format(
+                    len(claimed), len(claimed) - succeeded))
+
+    def enqueue(self, catalog_ids):
+        """Queue every kind of rebuild for the catalogs with catalog_ids, or
+        for every catalog if the list is empty."""
+        queryset = models.Catalog.objects.order_by("id")
+        if catalog_ids:
+            queryset = queryset.filter(id__in=catalog_ids)
+        catalog_list = list(queryset)
+        missing = set(catalog_ids) - {catalog.id for catalog in catalog_list}
+        if missing:
+            raise CommandError("There is no catalog with id {}.".format(
+                ", ".join(str(catalog_id) for catalog_id in sorted(missing))))
+        for catalog in catalog_list:
+            jobs.enqueue_rebuilds(catalog)
+        print("Queued rebuilds for {} catalogs.".format(len(catalog_list)))
@@ -0,0 +1,119 @@
+"""Batched extraction of the catalog into plain Python structures.
+
+The views walk the ORM one object at a time, which is fine for a single page
+but hopeless for anything that wants the whole catalog at once. Everything in
+here pulls a table in a handful of chunked queries and hands back dictionaries
+and sets keyed on primary keys, so callers can do their work in memory."""
+
+from . import models
+
+# How many rows we ask SQLite for at once when streaming a table.
+CHUNK_SIZE = 2000
+
+
+def iter_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yield tuples of the given fields from queryset, fetching chunk_size rows
+    per query.
+
+    We page on the primary key instead of using OFFSET so every chunk is an
+    index range scan and memory stays bounded no matter how big the table is."""
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page.values_list("pk", *fields)[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row[1:]
+        # A short page means there's nothing left, so skip the empty query
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def model_fields(model):
+    """Return the column names we export for model, in declaration order."""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def outcome_bit(clo_id):
+    """Return the bitmask for a single core learning outcome."""
+    return 1 << (clo_id - 1)
+
+
+def program_courses(program_ids=None):
+    """Return {program_id: {course_id: elective}} for the specific courses
+    attached to each degree program."""
+    queryset = models.DPCourseSpecific.objects.all()
+    if program_ids is not None:
+        queryset = queryset.filter(degree_program_id__in=program_ids)
+    incidence = {}
+    for program_id, course_id, elective in iter_rows(
+            queryset, ("degree_program_id", "course_id", "elective")):
+        incidence.setdefault(program_id, {})[course_id] = elective
+    return incidence
+
+
+def course_outcomes(course_ids=None, catalog=None):
+    """Return {course_id: bitmask} where bit n - 1 is set if the course
+    provides core learning outcome n according to catalog, or according to
+    any catalog if it's None."""
+    queryset = models.CourseLearningOutcome.objects.all()
+    if course_ids is not None:
+        queryset = queryset.filter(course_id__in=course_ids)
+    if catalog is not None:
+        queryset = queryset.filter(catalog=catalog)
+    masks = {}
+    for course_id, clo_id in iter_rows(
+            queryset, ("course_id", "learning_outcome_id")):
+        masks[course_id] = masks.get(course_id, 0) | outcome_bit(clo_id)
+    return masks
+
+
+def course_details(course_ids, catalog=None):
+    """Return {course_id: (label, lower_credit_bound, upper_credit_bound)} as
+    catalog describes each course. Courses catalog has no copy of (or every
+    course, if catalog is None) fall back to the shared Course row."""
+    course_ids = list(course_ids)
+    details = {}
+    if catalog is not None:
+        for course_id, *detail in models.CatalogCourse.objects.filter(
+                catalog=catalog, course_id__in=course_ids).values_list(
+                    "course_id", "label", "lower_credit_bound",
+                    "upper_credit_bound"):
+            details[course_id] = tuple(detail)
+    missing = [course_id for course_id in course_ids
+               if course_id not in details]
+    if missing:
+        for course_id, *detail in models.Course.objects.filter(
+                id__in=missing).values_list("id", "label",
+                                            "lower_credit_bound",
+                                            "upper_credit_bound"):
+            details[course_id] = tuple(detail)
+    return details
+
+
+def substitute_edges(program_ids=None):
+    """Return (specific, generic) substitution edges.
+
+    specific - List of (program_id, parent_course_id, course_id)
+    generic - List of (program_id, parent_course_id, credit_type, credits, elective)"""
+    specific_qs = models.DPCourseSubstituteSpecific.objects.all()
+    generic_qs = models.DPCourseSubstituteGeneric.objects.all()
+    if program_ids is not None:
+        specific_qs = specific_qs.filter(
+            parent_course__degree_program_id__in=program_ids)
+        generic_qs = generic_qs.filter(
+            parent_course__degree_program_id__in=program_ids)
+    specific = list(iter_rows(specific_qs,
+                              ("parent_course__degree_program_id",
+                               "parent_course__course_id",
+                               "course_id")))
+    generic = list(iter_rows(generic_qs,
+                             ("parent_course__degree_program_id",
+                              "parent_course__course_id",
+                              "credit_type_id",
+                              "credits",
+                              "elective")))
+    return (specific, generic)
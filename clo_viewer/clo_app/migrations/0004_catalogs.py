@@ -0,0 +1,59 @@
+# Generated by Django 2.0.1 on 2026-10-19 16:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def adopt_existing_programs(apps, schema_editor):
+    """Put any programs imported before catalogs existed into one catalog and
+    make it the active one."""
+    Catalog = apps.get_model('clo_app', 'Catalog')
+    ActiveCatalog = apps.get_model('clo_app', 'ActiveCatalog')
+    DegreeProgram = apps.get_model('clo_app', 'DegreeProgram')
+    if not DegreeProgram.objects.exists():
+        return
+    catalog = Catalog.objects.create(label='Initial catalog')
+    DegreeProgram.objects.update(catalog=catalog)
+    ActiveCatalog.objects.create(catalog=catalog)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clo_app', '0003_auto_20180202_1924'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Catalog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.TextField()),
+                ('year', models.TextField(null=True)),
+                ('campus', models.TextField(null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('data', models.TextField()),
+                ('catalog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clo_app.Catalog')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActiveCatalog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('catalog', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='clo_app.Catalog')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='degreeprogram',
+            name='catalog',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='clo_app.Catalog'),
+        ),
+        migrations.RunPython(adopt_existing_programs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.0.1 on 2026-10-19 16:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clo_app', '0005_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgramCredits',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('required_lower', models.FloatField()),
+                ('required_upper', models.FloatField()),
+                ('elective_lower', models.FloatField()),
+                ('elective_upper', models.FloatField()),
+                ('generic_required', models.FloatField()),
+                ('generic_elective', models.FloatField()),
+                ('total_lower', models.FloatField()),
+                ('total_upper', models.FloatField()),
+                ('problems', models.TextField()),
+                ('degree_program', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='clo_app.DegreeProgram')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.0.1 on 2026-10-19 16:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clo_app', '0006_program_credits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseImpact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('program_count', models.IntegerField()),
+                ('required_count', models.IntegerField()),
+                ('substitute_count', models.IntegerField()),
+                ('credit_reach', models.FloatField()),
+                ('clo_count', models.IntegerField()),
+                ('clo_sole', models.IntegerField()),
+                ('catalog', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='clo_app.Catalog')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clo_app.Course')),
+            ],
+            options={
+                'unique_together': {('catalog', 'course')},
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 2.0.1 on 2026-10-19 16:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_courses_into_catalogs(apps, schema_editor):
+    """Give every existing catalog its own copy of the courses its programs
+    use and of their outcome links, taken from the shared rows, then drop the
+    shared links."""
+    Catalog = apps.get_model('clo_app', 'Catalog')
+    CatalogCourse = apps.get_model('clo_app', 'CatalogCourse')
+    Course = apps.get_model('clo_app', 'Course')
+    CourseLearningOutcome = apps.get_model('clo_app', 'CourseLearningOutcome')
+    DPCourseSpecific = apps.get_model('clo_app', 'DPCourseSpecific')
+    DPCourseSubstituteSpecific = apps.get_model('clo_app',
+                                                'DPCourseSubstituteSpecific')
+    shared_links = CourseLearningOutcome.objects.filter(catalog=None)
+    catalogs = list(Catalog.objects.all())
+    for catalog in catalogs:
+        course_ids = set(DPCourseSpecific.objects.filter(
+            degree_program__catalog=catalog).values_list('course_id',
+                                                         flat=True))
+        course_ids.update(DPCourseSubstituteSpecific.objects.filter(
+            parent_course__degree_program__catalog=catalog).values_list(
+                'course_id', flat=True))
+        CatalogCourse.objects.bulk_create(
+            [CatalogCourse(catalog=catalog,
+                           course_id=course_id,
+                           label=label,
+                           lower_credit_bound=lower,
+                           upper_credit_bound=upper)
+             for course_id, label, lower, upper in Course.objects.filter(
+                 id__in=list(course_ids)).values_list(
+                     'id', 'label', 'lower_credit_bound',
+                     'upper_credit_bound')])
+        CourseLearningOutcome.objects.bulk_create(
+            [CourseLearningOutcome(catalog=catalog,
+                                   course_id=course_id,
+                                   learning_outcome_id=outcome_id)
+             for course_id, outcome_id in shared_links.filter(
+                 course_id__in=list(course_ids)).values_list(
+                     'course_id', 'learning_outcome_id')])
+    if catalogs:
+        shared_links.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clo_app', '0007_course_impact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courselearningoutcome',
+            name='catalog',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='clo_app.Catalog'),
+        ),
+        migrations.CreateModel(
+            name='CatalogCourse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.TextField()),
+                ('lower_credit_bound', models.FloatField(null=True)),
+                ('upper_credit_bound', models.FloatField(null=True)),
+                ('catalog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clo_app.Catalog')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clo_app.Course')),
+            ],
+            options={
+                'unique_together': {('catalog', 'course')},
+            },
+        ),
+        migrations.RunPython(copy_courses_into_catalogs, migrations.RunPython.noop),
+    ]
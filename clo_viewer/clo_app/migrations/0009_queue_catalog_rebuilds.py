@@ -0,0 +1,37 @@
+# Generated by Django 2.0.1 on 2026-10-19 17:05
+
+from django.db import migrations
+
+
+# The job kinds in clo_app.jobs.TASKS when this migration was written. They're
+# spelled out rather than imported so later changes to TASKS can't change what
+# this migration does.
+KINDS = ['catalog_snapshot', 'program_credits', 'course_impact']
+
+
+def queue_catalog_rebuilds(apps, schema_editor):
+    """Queue every derived data rebuild for the catalogs that already exist,
+    since their snapshots and totals predate per catalog course data and some
+    were imported before the kinds existed at all."""
+    Catalog = apps.get_model('clo_app', 'Catalog')
+    Job = apps.get_model('clo_app', 'Job')
+    pending = set(Job.objects.filter(status='pending').values_list(
+        'kind', 'catalog_id'))
+    Job.objects.bulk_create(
+        [Job(kind=kind, catalog_id=catalog_id)
+         for catalog_id in Catalog.objects.order_by('id').values_list(
+             'id', flat=True)
+         for kind in KINDS
+         if (kind, catalog_id) not in pending])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clo_app', '0008_catalog_courses'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_catalog_rebuilds,
+                             migrations.RunPython.noop),
+    ]
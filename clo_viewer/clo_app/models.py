@@ -27,16 +27,96 @@ class Course(models.Model):
     
 class CourseLearningOutcome(models.Model):
     """Represents a CoreLearningOutcome associated with a Course."""
+    # Which outcomes a course provides can change between catalogs, so every
+    # catalog records its own links
+    catalog = models.ForeignKey("Catalog", on_delete=models.CASCADE, null=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     learning_outcome = models.ForeignKey(CoreLearningOutcome, on_delete=models.PROTECT)
 
+class Catalog(models.Model):
+    """Represents one version of the class schedule, such as the 2018-2019 
+    catalog for a particular campus. Every import lands in a new Catalog so 
+    loading a new year doesn't throw away the old one."""
+    label = models.TextField()
+    year = models.TextField(null=True)
+    campus = models.TextField(null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+class CatalogCourse(models.Model):
+    """A Course as one catalog describes it. The course ID means the same 
+    thing from year to year but its name and credits don't have to, so every 
+    import records its own copy here rather than overwriting the Course row 
+    older catalogs still use."""
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    label = models.TextField()
+    lower_credit_bound = models.FloatField(null=True)
+    upper_credit_bound = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ("catalog", "course")
+
+class ActiveCatalog(models.Model):
+    """The catalog the site shows when a request doesn't ask for one. There 
+    is only ever one row, so switching catalogs is a single UPDATE."""
+    catalog = models.ForeignKey(Catalog, on_delete=models.PROTECT)
+
+class CatalogSnapshot(models.Model):
+    """Precomputed course sets and CLO coverage for every program in a catalog, 
+    stored as JSON. Comparing catalogs is then set arithmetic on two of these 
+    instead of a pile of queries."""
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+    data = models.TextField()
+
 class DegreeProgram(models.Model):
     """Represents a Degree Program that someone can pursue at EvCC."""
+    # Course IDs are shared between catalogs since they mean the same thing
+    # from year to year, but the programs built out of them are not. What each
+    # catalog says about a course lives in CatalogCourse.
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, null=True)
     label = models.TextField()
     credits = models.FloatField()
     elective_credits = models.FloatField(null=True)
 
     
+class ProgramCredits(models.Model):
+    """Credit totals for a Degree Program, worked out from its courses by 
+    clo_app.credits. Since courses have credit ranges and substitutes, every 
+    total is a lower and an upper bound. problems lists, one per line, the 
+    reasons the totals don't reconcile with the credits the program declares."""
+    degree_program = models.OneToOneField(DegreeProgram,
+                                          on_delete=models.CASCADE)
+    required_lower = models.FloatField()
+    required_upper = models.FloatField()
+    elective_lower = models.FloatField()
+    elective_upper = models.FloatField()
+    generic_required = models.FloatField()
+    generic_elective = models.FloatField()
+    total_lower = models.FloatField()
+    total_upper = models.FloatField()
+    problems = models.TextField()
+    
+    def problem_list(self):
+        return self.problems.splitlines()
+
+class CourseImpact(models.Model):
+    """How much of a catalog depends on a Course, worked out by
+    clo_app.impact: how many programs list it or accept it as a substitute,
+    what share of their credits it accounts for and how many core learning
+    outcomes it provides, including ones no other course in a program does."""
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, null=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    program_count = models.IntegerField()
+    required_count = models.IntegerField()
+    substitute_count = models.IntegerField()
+    credit_reach = models.FloatField()
+    clo_count = models.IntegerField()
+    clo_sole = models.IntegerField()
+
+    class Meta:
+        unique_together = ("catalog", "course")
+
 class DPCourseSpecific(models.Model):
     """Represents a specific Course associated with a Degree Program."""
     degree_program = models.ForeignKey(DegreeProgram, on_delete=models.CASCADE)
@@ -66,3 +146,24 @@ class DPCourseSubstituteGeneric(models.Model):
     credit_type = models.ForeignKey(CreditType, on_delete=models.PROTECT)
     credits = models.FloatField(null=True)
     elective = models.BooleanField()
+
+class Job(models.Model):
+    """A rebuild of some derived data, such as a catalog snapshot, waiting for 
+    the worker command to pick it up. Keeping the queue in the database means 
+    we don't need a separate message broker."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = ((PENDING, "Pending"),
+                      (RUNNING, "Running"),
+                      (DONE, "Done"),
+                      (FAILED, "Failed"))
+    kind = models.TextField()
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING, db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    error = models.TextField(null=True)
@@ -0,0 +1,36 @@
+"""Per-connection SQLite tuning.
+
+Django opens SQLite connections with the library defaults: a rollback journal,
+so the importer locks readers out while it writes, and a small page cache.
+configure_connection runs for every new connection and applies the pragmas in
+settings.SQLITE_PRAGMAS, in order. The catalog web settings add query_only so
+request workers can't write even by accident.
+
+The journal mode is different: it's stored in the database file itself, so
+setting it on every connection would rewrite the file even for commands that
+only read. The commands that write call set_journal_mode once instead."""
+
+from django.conf import settings
+from django.db import connections
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created handler that applies settings.SQLITE_PRAGMAS."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(pragma, value))
+
+def set_journal_mode(using="default"):
+    """Switch the database to settings.SQLITE_JOURNAL_MODE unless it already
+    uses it. Must be called outside a transaction."""
+    connection = connections[using]
+    mode = getattr(settings, "SQLITE_JOURNAL_MODE", None)
+    if connection.vendor != "sqlite" or mode is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        if cursor.fetchone()[0].lower() != mode.lower():
+            cursor.execute("PRAGMA journal_mode = {}".format(mode))
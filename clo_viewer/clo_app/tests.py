@@ -1,3 +1,802 @@
-from django.test import TestCase
+import io
+import os
+import json
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from . import models
+from . import catalogs
+from . import comparison
+from . import credits
+from . import csv_import
+from . import impact
+from . import import_context
+from . import jobs
+from . import matrices
+
+# Golden query plans live next to this file, one JSON file per view.
+# Run the tests with UPDATE_QUERY_PLANS=1 to rewrite them after an intentional
+# change, and review the diff like any other code change.
+QUERY_PLAN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "query_plans")
+UPDATE_QUERY_PLANS = bool(os.environ.get("UPDATE_QUERY_PLANS"))
+
+
+def build_fixture_catalog():
+    """Create a small catalog that exercises every model the views touch and
+    return a dict of the interesting objects."""
+    clos = [models.CoreLearningOutcome.objects.create(
+        label="Outcome {}".format(number),
+        description="Description {}".format(number))
+            for number in range(1, 8)]
+    for label_short in ("CS", "NS", "H", "QS", "E"):
+        models.CreditType.objects.create(label_short=label_short,
+                                         label=label_short)
+    catalog = models.Catalog.objects.create(label="Fixture catalog",
+                                            year="2018")
+    catalogs.activate(catalog)
+    courses = []
+    for number in range(10):
+        course = models.Course.objects.create(
+            id="TEST {}".format(100 + number),
+            label="Test Course {}".format(number),
+            lower_credit_bound=3 + number % 3,
+            upper_credit_bound=5)
+        courses.append(course)
+        models.CatalogCourse.objects.create(
+            catalog=catalog,
+            course=course,
+            label=course.label,
+            lower_credit_bound=course.lower_credit_bound,
+            upper_credit_bound=course.upper_credit_bound)
+        for clo in clos[number % 3:number % 3 + 1 + number % 4]:
+            models.CourseLearningOutcome.objects.create(catalog=catalog,
+                                                        course=course,
+                                                        learning_outcome=clo)
+    programs = []
+    for number in range(4):
+        program = models.DegreeProgram.objects.create(
+            catalog=catalog,
+            label="ATA - Program {}".format(number),
+            credits=90,
+            elective_credits=10)
+        programs.append(program)
+        for course in courses[number * 2:number * 2 + 5]:
+            specific = models.DPCourseSpecific.objects.create(
+                degree_program=program,
+                course=course,
+                elective=course.id.endswith("4"))
+        models.DPCourseSubstituteSpecific.objects.create(
+            parent_course=specific, course=courses[0])
+        models.DPCourseGeneric.objects.create(
+            degree_program=program,
+            credit_type_id="H",
+            credits=5,
+            elective=False)
+    # A later catalog with one of the programs changed, for the diff page
+    later_catalog = models.Catalog.objects.create(label="Later catalog",
+                                                  year="2019")
+    later_program = models.DegreeProgram.objects.create(
+        catalog=later_catalog,
+        label=programs[0].label,
+        credits=90)
+    for course in courses[1:6]:
+        models.DPCourseSpecific.objects.create(degree_program=later_program,
+                                               course=course,
+                                               elective=False)
+        # The later catalog drops every course to 4 credits and the first
+        # outcome, without touching the earlier catalog's copies
+        models.CatalogCourse.objects.create(catalog=later_catalog,
+                                            course=course,
+                                            label=course.label,
+                                            lower_credit_bound=4,
+                                            upper_credit_bound=4)
+        for link in models.CourseLearningOutcome.objects.filter(
+                catalog=catalog, course=course).exclude(
+                    learning_outcome=clos[0]):
+            models.CourseLearningOutcome.objects.create(
+                catalog=later_catalog,
+                course=course,
+                learning_outcome=link.learning_outcome)
+    catalogs.build_snapshot(catalog)
+    catalogs.build_snapshot(later_catalog)
+    credits.publish_credits(catalog, credits.compute_credits(
+        *credits.catalog_credit_inputs(catalog)))
+    impact.publish_impact(catalog, impact.compute_impact(
+        *impact.catalog_impact_inputs(catalog)))
+    return {"catalog":catalog,
+            "later_catalog":later_catalog,
+            "programs":programs,
+            "courses":courses,
+            "clos":clos}
+
+
+class QueryRecorder:
+    """Execute wrapper that remembers the SQL and parameters of every
+    statement run while it's installed."""
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def normalize_plan_line(detail):
+    """Strip the differences between SQLite versions out of a plan line."""
+    return detail.replace("SCAN TABLE ", "SCAN ").replace(
+        "SEARCH TABLE ", "SEARCH ")
+
+def is_full_scan(detail):
+    """Return True if the plan line reads an entire table rather than using an
+    index to find rows."""
+    return detail.startswith("SCAN ") and "USING" not in detail
+
+def explain(sql, params):
+    """Return the normalized EXPLAIN QUERY PLAN lines for a statement."""
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [normalize_plan_line(row[-1]) for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """Guard the views against silently picking up extra queries or full table
+    scans.
+
+    Each view is rendered against the fixture catalog while every statement is
+    recorded and explained. The result is compared to the golden file for the
+    view: the test fails if the view runs more queries than before or does a
+    full table scan that isn't already in the golden file."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture_catalog()
+
+    def setUp(self):
+        # Guard the pages as they render with nothing cached, which is when
+        # they actually run their queries
+        cache.clear()
+
+    def view_urls(self):
+        """Return (golden name, url) for every view we guard."""
+        program = self.fixture["programs"][0]
+        return [
+            ("home", reverse("home")),
+            ("about", reverse("about")),
+            ("programs", reverse("programs")),
+            ("outcomes", reverse("outcomes")),
+            ("degree_program", reverse("degree-program",
+                                       kwargs={"pid":program.id})),
+            ("degree_program_diff", reverse(
+                "degree-program-diff",
+                kwargs={"pid":program.id,
+                        "catalog_id":self.fixture["later_catalog"].id})),
+            ("compare", reverse("compare") + "?programs={}".format(
+                ",".join(str(program.id)
+                         for program in self.fixture["programs"]))),
+            ("credit_audit", reverse("credit-audit")),
+            ("course_impact", reverse("course-impact") + "?sort=clo_sole"),
+            ("course_impact_json", reverse("course-impact-json")),
+            ("course_impact_lookup", reverse(
+                "course-impact-lookup",
+                kwargs={"course_id":self.fixture["courses"][2].id})),
+            ("clo", reverse("clo", kwargs={"clo_id":self.fixture["clos"][1].id})),
+        ]
+
+    def capture(self, url):
+        """Request url and return the list of {sql, plan} it produced."""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.client.get(url, HTTP_HOST="localhost")
+        self.assertEqual(response.status_code, 200, url)
+        captured = []
+        for sql, params in recorder.queries:
+            if not sql.lstrip().upper().startswith("SELECT"):
+                captured.append({"sql":sql, "plan":[]})
+                continue
+            captured.append({"sql":sql, "plan":explain(sql, params)})
+        return captured
+
+    def test_query_plans(self):
+        for name, url in self.view_urls():
+            with self.subTest(view=name):
+                self.check_against_golden(name, self.capture(url))
+
+    def check_against_golden(self, name, captured):
+        path = os.path.join(QUERY_PLAN_DIR, name + ".json")
+        if not UPDATE_QUERY_PLANS:
+            # Writing a missing golden file here would let a new view, or a
+            # deleted file, pass without anyone reviewing its plans
+            self.assertTrue(
+                os.path.exists(path),
+                "There is no golden file for {}. Run the tests with"
+                " UPDATE_QUERY_PLANS=1 to record one.".format(name))
+        else:
+            os.makedirs(QUERY_PLAN_DIR, exist_ok=True)
+            with open(path, "w") as golden_file:
+                json.dump({"queries":captured}, golden_file, indent=2)
+                golden_file.write("\n")
+            return
+        with open(path) as golden_file:
+            golden = json.load(golden_file)["queries"]
+        self.assertLessEqual(
+            len(captured), len(golden),
+            "{} now runs {} queries, the golden file has {}. Rerun with"
+            " UPDATE_QUERY_PLANS=1 if this is intentional.".format(
+                name, len(captured), len(golden)))
+        known_scans = {line for query in golden for line in query["plan"]
+                       if is_full_scan(line)}
+        new_scans = {line for query in captured for line in query["plan"]
+                     if is_full_scan(line)} - known_scans
+        self.assertFalse(
+            new_scans,
+            "{} picked up new full table scans: {}".format(
+                name, ", ".join(sorted(new_scans))))
+
+
+class ComputeCreditsTests(SimpleTestCase):
+    """credits.compute_credits on small hand built programs, no database."""
+
+    def compute(self, declared=10, elective_credits=None, courses=None,
+                bounds=None, specific=(), generic_substitutes=(),
+                generics=()):
+        """Run compute_credits for a single program 1 and return its totals."""
+        return credits.compute_credits([(1, declared, elective_credits)],
+                                       {1:courses or {}},
+                                       bounds or {},
+                                       list(specific),
+                                       list(generic_substitutes),
+                                       list(generics))[1]
+
+    def test_required_courses_add_up(self):
+        totals = self.compute(declared=8,
+                              courses={"A 1":False, "B 1":False},
+                              bounds={"A 1":(3, 3), "B 1":(5, 5)})
+        self.assertEqual((totals["total_lower"], totals["total_upper"]),
+                         (8, 8))
+        self.assertEqual(totals["problems"], [])
+
+    def test_substitutes_give_min_and_max(self):
+        totals = self.compute(declared=5,
+                              courses={"A 1":False},
+                              bounds={"A 1":(5, 5), "B 1":(3, 3),
+                                      "C 1":(4, 6)},
+                              specific=[(1, "A 1", "B 1"),
+                                        (1, "A 1", "C 1")],
+                              generic_substitutes=[(1, "A 1", "H", 7,
+                                                    False)])
+        self.assertEqual((totals["required_lower"], totals["required_upper"]),
+                         (3, 7))
+        self.assertEqual(totals["problems"], [])
+
+    def test_declared_credits_within_tolerance(self):
+        bounds = {"A 1":(5, 5)}
+        courses = {"A 1":False}
+        self.assertEqual(self.compute(declared=5 + credits.TOLERANCE / 2,
+                                      courses=courses,
+                                      bounds=bounds)["problems"], [])
+        problems = self.compute(declared=5 + credits.TOLERANCE * 2,
+                                courses=courses, bounds=bounds)["problems"]
+        self.assertEqual(len(problems), 1)
+        self.assertIn("program declares", problems[0])
+
+    def test_elective_pool(self):
+        # Elective credits count towards the total, the listed electives
+        # only have to be able to cover them
+        bounds = {"A 1":(5, 5), "E 1":(3, 3), "E 2":(2, 4)}
+        courses = {"A 1":False, "E 1":True, "E 2":True}
+        totals = self.compute(declared=11, elective_credits=6,
+                              courses=courses, bounds=bounds)
+        self.assertEqual((totals["elective_lower"], totals["elective_upper"]),
+                         (5, 7))
+        self.assertEqual((totals["total_lower"], totals["total_upper"]),
+                         (11, 11))
+        self.assertEqual(totals["problems"], [])
+        problems = self.compute(declared=13, elective_credits=8,
+                                courses=courses, bounds=bounds)["problems"]
+        self.assertEqual(problems, ["Only 7 elective credits are listed but 8"
+                                    " are required."])
+
+    def test_generics_and_missing_credits(self):
+        totals = self.compute(declared=10,
+                              courses={"A 1":False, "B 1":False},
+                              bounds={"A 1":(5, 5), "B 1":(None, None)},
+                              generics=[(1, 5, False), (1, 3, True)])
+        self.assertEqual(totals["generic_required"], 5)
+        self.assertEqual(totals["generic_elective"], 3)
+        self.assertEqual(totals["total_lower"], 10)
+        self.assertEqual(totals["problems"],
+                         ["No credits recorded for B 1."])
+
+
+class ValidateProgramTests(SimpleTestCase):
+    """csv_import.validate_program and validate_file on small in-memory
+    files."""
+
+    HEADER = "Program,Credits,Elective Credits,CLO,Elective\n"
+    CLO_IDS = set(range(1, 8))
+
+    def program(self, *rows):
+        """Return a program as read_numbered_program_rows gives it, starting
+        with its ATA row at line 2."""
+        return [(line_number, row)
+                for line_number, row in enumerate(rows, start=2)]
+
+    def messages(self, issues):
+        return [message for line_number, message in issues]
+
+    def test_clean_program(self):
+        program = self.program(["ATA - Test", "10", "N.A.", "", ""],
+                               ["MATH 110", "Algebra or", "5", "1 2", ""],
+                               ["MATH 111", "Algebra II", "5", "2", ""],
+                               ["Generic Humanities", "Humanities", "5", "",
+                                ""])
+        self.assertEqual(csv_import.validate_program(program, self.CLO_IDS),
+                         [])
+
+    def test_row_problems(self):
+        program = self.program(["ATA - Test", "5", "", "", ""],
+                               ["MATH 110", "Algebra", "5-3", "1 9", ""],
+                               ["Math110", "Algebra again", "5", "1", ""],
+                               ["Generic Stuff", "Something", "lots", "", ""])
+        self.assertEqual(
+            sorted(csv_import.validate_program(program, self.CLO_IDS)),
+            [(2, "ATA - Test: Courses add up to 5-3 credits but the program"
+              " declares 5."),
+             (3, "ATA - Test: Credit range '5-3' is backwards."),
+             (3, "ATA - Test: Unknown CLO ids 9."),
+             (4, "ATA - Test: Malformed class id 'Math110', the import will"
+              " skip this row."),
+             (5, "ATA - Test: Can't read credits 'lots'."),
+             (5, "ATA - Test: Can't tell the credit type of"
+              " 'Generic Stuff'.")])
+
+    def test_generic_rows_count_towards_credits(self):
+        # 5 for the course plus 5 for the generic requirement, so declaring 5
+        # is reported and declaring 10 isn't
+        rows = [["MATH 110", "Algebra", "5", "1", ""],
+                ["Generic Humanities", "Humanities", "5", "", ""]]
+        self.assertEqual(self.messages(csv_import.validate_program(
+            self.program(["ATA - Test", "10", "", "", ""], *rows),
+            self.CLO_IDS)), [])
+        self.assertEqual(self.messages(csv_import.validate_program(
+            self.program(["ATA - Test", "5", "", "", ""], *rows),
+            self.CLO_IDS)),
+            ["ATA - Test: Courses add up to 10-10 credits but the program"
+             " declares 5."])
+
+    def test_dangling_substitute(self):
+        program = self.program(["ATA - Test", "5", "", "", ""],
+                               ["MATH 110", "Algebra or", "5", "1", ""])
+        self.assertEqual(self.messages(csv_import.validate_program(
+            program, self.CLO_IDS)),
+            ["ATA - Test: Last course ends in 'or' but nothing follows it to"
+             " substitute."])
+
+    def test_validate_file(self):
+        programs_csv = io.StringIO(
+            self.HEADER
+            + "MATH 110,Orphan,5,1,\n"
+            + "ATA - First,5,,,\n"
+            + "MATH 110,Algebra,5,8,\n"
+            + "ATA - Second,N.A.,,,\n"
+            + "MATH 111,Algebra II,5,1,\n")
+        self.assertEqual(
+            csv_import.validate_file(programs_csv, self.CLO_IDS),
+            [(2, "Row before the first ATA line, the import won't run."),
+             (4, "ATA - First: Unknown CLO ids 8."),
+             (5, "ATA - Second: Program has no credits, which the import"
+              " requires.")])
+
+    def test_validate_file_duplicate_programs(self):
+        programs_csv = io.StringIO(
+            self.HEADER
+            + "ATA - First,5,,,\n"
+            + "MATH 110,Algebra,5,1,\n"
+            + "ATA - First,5,,,\n"
+            + "MATH 111,Algebra II,5,1,\n")
+        self.assertEqual(
+            csv_import.validate_file(programs_csv, self.CLO_IDS),
+            [(4, "ATA - First: Program already listed on line 2.")])
+
+    def test_import_reads_what_validation_passes(self):
+        # Blank rows and section headings are fine for both
+        text = (self.HEADER
+                + "ATA - First,10,,,\n"
+                + "Core,,,,\n"
+                + "MATH 110,Algebra,5,1,\n"
+                + "\n"
+                + "Generic Humanities,Humanities,5,,\n"
+                + ",,,,\n"
+                + "ATA - Second,5,,,\n"
+                + "MATH 111,Algebra II,5,2,\n")
+        self.assertEqual(csv_import.validate_file(io.StringIO(text),
+                                                  self.CLO_IDS), [])
+        self.assertEqual(
+            csv_import.read_degree_program_rows(io.StringIO(text)),
+            [[["ATA - First", "10", "", "", ""],
+              ["MATH 110", "Algebra", "5", "1", ""],
+              ["Generic Humanities", "Humanities", "5", "", ""]],
+             [["ATA - Second", "5", "", "", ""],
+              ["MATH 111", "Algebra II", "5", "2", ""]]])
+
+    def test_import_stops_where_validation_fails(self):
+        for text, line_number in (("MATH 110,Orphan,5,1,\nATA - First,5,,,\n",
+                                   2),
+                                  ("ATA - First,5\n", 2),
+                                  ("ATA - First,5,,,\nMATH 110,Algebra\n", 3)):
+            issues = csv_import.validate_file(io.StringIO(self.HEADER + text),
+                                              self.CLO_IDS)
+            self.assertIn(line_number, [issue[0] for issue in issues])
+            with self.assertRaisesRegex(ValueError,
+                                        "Line {}".format(line_number)):
+                csv_import.read_degree_program_rows(
+                    io.StringIO(self.HEADER + text))
+        with self.assertRaisesRegex(ValueError, "No ATA program lines"):
+            csv_import.read_degree_program_rows(io.StringIO(self.HEADER))
+
+    def test_validate_file_without_programs(self):
+        self.assertEqual(
+            csv_import.validate_file(io.StringIO(self.HEADER), self.CLO_IDS),
+            [(1, "No ATA program lines found.")])
+
+
+class ComputeImpactTests(SimpleTestCase):
+    """impact.compute_impact on two small hand built programs, no database."""
+
+    def setUp(self):
+        bit = matrices.outcome_bit
+        # Program 1 has A and B required and C as an elective, with D as a
+        # substitute for A. Program 2 has A and C, and declares no credits.
+        self.results = impact.compute_impact(
+            programs=[(1, 20), (2, None)],
+            program_courses={1:{"A 1":False, "B 1":False, "C 1":True},
+                             2:{"A 1":False, "C 1":False}},
+            specific=[(1, "A 1", "D 1")],
+            course_credits={"A 1":5, "B 1":5, "C 1":10, "D 1":None},
+            course_outcomes={"A 1":bit(1) | bit(2),
+                             "B 1":bit(2),
+                             "C 1":bit(3),
+                             "D 1":bit(4)})
+
+    def test_counts(self):
+        self.assertEqual(
+            {course_id:(figures["program_count"], figures["required_count"],
+                        figures["substitute_count"], figures["clo_count"])
+             for course_id, figures in self.results.items()},
+            {"A 1":(2, 2, 0, 2),
+             "B 1":(1, 1, 0, 1),
+             "C 1":(2, 1, 0, 1),
+             "D 1":(0, 0, 1, 1)})
+
+    def test_clo_sole(self):
+        # In program 1 outcome 2 comes from A and B, so only A's outcome 1
+        # and C's outcome 3 are sole. Program 2 adds A's 1 and 2 and C's 3.
+        # Substitutes don't provide outcomes to the program.
+        self.assertEqual(
+            {course_id:figures["clo_sole"]
+             for course_id, figures in self.results.items()},
+            {"A 1":3, "B 1":0, "C 1":2, "D 1":0})
+
+    def test_credit_reach(self):
+        # Only program 1 declares credits, and a substitute without credits
+        # adds nothing
+        self.assertEqual(
+            {course_id:figures["credit_reach"]
+             for course_id, figures in self.results.items()},
+            {"A 1":0.25, "B 1":0.25, "C 1":0.5, "D 1":0.0})
+
+
+class DiffProgramTests(SimpleTestCase):
+    """catalogs.diff_program on hand built snapshot entries."""
+
+    def test_changes(self):
+        old = {"courses":["A 1", "B 1", "C 1"],
+               "outcomes":{"1":["A 1"], "2":["A 1", "B 1"]}}
+        new = {"courses":["B 1", "C 1", "D 1"],
+               "outcomes":{"2":["B 1", "D 1"], "10":["D 1"]}}
+        self.assertEqual(catalogs.diff_program(old, new), {
+            "added_courses":["D 1"],
+            "removed_courses":["A 1"],
+            "kept_courses":["B 1", "C 1"],
+            # Outcome ids sort as numbers, so 10 comes after 2
+            "outcomes":[{"clo_id":1, "before":1, "after":0,
+                         "added":[], "removed":["A 1"]},
+                        {"clo_id":2, "before":2, "after":2,
+                         "added":["D 1"], "removed":["A 1"]},
+                        {"clo_id":10, "before":0, "after":1,
+                         "added":["D 1"], "removed":[]}]})
+
+    def test_program_only_in_one_catalog(self):
+        entry = {"courses":["A 1"], "outcomes":{"3":["A 1"]}}
+        added = catalogs.diff_program(None, entry)
+        self.assertEqual(added["added_courses"], ["A 1"])
+        self.assertEqual(added["outcomes"], [{"clo_id":3, "before":0,
+                                              "after":1, "added":["A 1"],
+                                              "removed":[]}])
+        removed = catalogs.diff_program(entry, None)
+        self.assertEqual(removed["removed_courses"], ["A 1"])
+        self.assertEqual(removed["kept_courses"], [])
+
+
+class DecodeSnapshotTests(SimpleTestCase):
+    """The decoded snapshot cache in catalogs."""
+
+    def setUp(self):
+        catalogs._decoded_snapshots.clear()
+
+    def tearDown(self):
+        catalogs._decoded_snapshots.clear()
+
+    def test_keeps_most_recently_used(self):
+        first = catalogs._decode_snapshot(-1, '{"n":1}')
+        for snapshot_id in range(-2, -1 - catalogs.MAX_DECODED_SNAPSHOTS, -1):
+            catalogs._decode_snapshot(snapshot_id, "{}")
+            # Keep using the first one so it's never the oldest
+            self.assertIs(catalogs._decode_snapshot(-1, "{}"), first)
+        catalogs._decode_snapshot(-100, "{}")
+        self.assertIs(catalogs._decode_snapshot(-1, "{}"), first)
+        self.assertEqual(len(catalogs._decoded_snapshots),
+                         catalogs.MAX_DECODED_SNAPSHOTS)
+        self.assertNotIn(-2, catalogs._decoded_snapshots)
+
+    def test_threads(self):
+        def decode(number):
+            snapshot_id = -(number % (catalogs.MAX_DECODED_SNAPSHOTS * 2))
+            return catalogs._decode_snapshot(snapshot_id,
+                                             '{"id":%d}' % snapshot_id)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(decode, range(2000)))
+        for number, decoded in enumerate(results):
+            self.assertEqual(decoded["id"], -(
+                number % (catalogs.MAX_DECODED_SNAPSHOTS * 2)))
+
+
+class ComparisonTests(TestCase):
+    """comparison.compare_programs against the fixture catalog."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture_catalog()
+
+    def test_shared_and_unique_courses(self):
+        # Program 0 has courses 0-4 and program 1 courses 2-6
+        first, second = self.fixture["programs"][:2]
+        result = comparison.compare_programs([first.id, second.id])
+        ids = lambda courses: [course.id for course in courses]
+        self.assertEqual(ids(result["shared_courses"]),
+                         ["TEST 102", "TEST 103", "TEST 104"])
+        self.assertEqual([(program.id, ids(courses))
+                          for program, courses in result["unique_courses"]],
+                         [(first.id, ["TEST 100", "TEST 101"]),
+                          (second.id, ["TEST 105", "TEST 106"])])
+        self.assertEqual([(course.id, in_programs)
+                          for course, in_programs, outcomes
+                          in result["course_rows"]][:3],
+                         [("TEST 100", [True, False]),
+                          ("TEST 101", [True, False]),
+                          ("TEST 102", [True, True])])
+
+    def test_totals_match_credit_audit(self):
+        programs = self.fixture["programs"]
+        result = comparison.compare_programs([program.id
+                                              for program in programs])
+        expected = credits.compute_credits(*credits.catalog_credit_inputs(
+            self.fixture["catalog"]))
+        for program in result["programs"]:
+            self.assertEqual(
+                (program.totals.required_lower, program.totals.required_upper,
+                 program.totals.total_lower, program.totals.total_upper),
+                tuple(expected[program.id][total]
+                      for total in ("required_lower", "required_upper",
+                                    "total_lower", "total_upper")))
+
+
+def fail(*args):
+    raise ValueError("Broken on purpose")
+
+
+class JobQueueTests(TestCase):
+    """The rebuild queue in clo_app.jobs, with the compute step run in a thread
+    pool rather than processes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture_catalog()
+
+    def setUp(self):
+        self.catalog = self.fixture["catalog"]
+        self.pool = ThreadPoolExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_enqueue_reuses_pending_job(self):
+        job = jobs.enqueue("program_credits", self.catalog)
+        self.assertEqual(jobs.enqueue("program_credits", self.catalog).id,
+                         job.id)
+        self.assertNotEqual(jobs.enqueue("course_impact", self.catalog).id,
+                            job.id)
+        with self.assertRaises(ValueError):
+            jobs.enqueue("no_such_kind", self.catalog)
+
+    def test_claim_skips_running_jobs(self):
+        first = jobs.enqueue("program_credits", self.catalog)
+        second = jobs.enqueue("course_impact", self.catalog)
+        claimed = jobs.claim(1)
+        self.assertEqual([job.id for job in claimed], [first.id])
+        self.assertEqual(claimed[0].status, models.Job.RUNNING)
+        # Another worker asking for more only gets the one still pending
+        self.assertEqual([job.id for job in jobs.claim(5)], [second.id])
+        self.assertEqual(jobs.claim(5), [])
+
+    def test_failed_fetch_and_compute(self):
+        broken = {"broken_fetch":jobs.Task(fail, fail, fail),
+                  "broken_compute":jobs.Task(lambda catalog: (), fail, fail)}
+        with mock.patch.dict(jobs.TASKS, broken):
+            for kind in broken:
+                jobs.enqueue(kind, self.catalog)
+            claimed = jobs.claim(5)
+            self.assertEqual(jobs.run_jobs(claimed, self.pool), 0)
+        for job in models.Job.objects.filter(kind__in=list(broken)):
+            self.assertEqual(job.status, models.Job.FAILED)
+            self.assertIn("Broken on purpose", job.error)
+            self.assertIsNotNone(job.finished)
+
+    def test_publish_replaces_rows(self):
+        program = self.fixture["programs"][0]
+        before = models.ProgramCredits.objects.get(degree_program=program)
+        # Every course in the catalog gains a credit
+        for catalog_course in models.CatalogCourse.objects.filter(
+                catalog=self.catalog):
+            catalog_course.lower_credit_bound += 1
+            catalog_course.upper_credit_bound += 1
+            catalog_course.save()
+        jobs.enqueue("program_credits", self.catalog)
+        self.assertEqual(jobs.run_jobs(jobs.claim(5), self.pool), 1)
+        self.assertEqual(models.Job.objects.get().status, models.Job.DONE)
+        after = models.ProgramCredits.objects.get(degree_program=program)
+        self.assertNotEqual(after.id, before.id)
+        self.assertGreater(after.required_lower, before.required_lower)
+        self.assertEqual(models.ProgramCredits.objects.filter(
+            degree_program__catalog=self.catalog).count(),
+                         len(self.fixture["programs"]))
+
+
+IMPORT_CSV = """Program,Credits,Elective Credits,CLO,Elective
+ATA - Alpha,20,N.A.,,
+Core,,,,
+MATH 110,Algebra or,5,1 2,
+MATH 111,Algebra II,5,2,
+ENGL& 101,English,5,3,
+Generic Humanities,Humanities,5,,
+ATA - Beta,15,5,,
+ENGL& 101,English,5,3,
+CS 141,Programming,5,2 6,
+MATH 110,Algebra,5,1 2,
+Electives,,,,
+BUS 101,Business,3-5,1,x
+ATA - Gamma,10,N.A.,,
+MATH 110,Algebra,5,1,
+CS 141,Programming,5,6,
+"""
+
+
+class ImportTests(TestCase):
+    """Run degree_program_import end to end on a small file."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # The import expects the outcomes the initialization pass creates
+        for number in range(1, 8):
+            models.CoreLearningOutcome.objects.create(
+                id=number,
+                label="Outcome {}".format(number),
+                description="Description {}".format(number))
+        for label_short in ("H", "QS", "E"):
+            models.CreditType.objects.create(label_short=label_short,
+                                             label=label_short)
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as programs_csv:
+            programs_csv.write(IMPORT_CSV)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def run_import(self, *args):
+        """Import the file into a new catalog and return (catalog, output,
+        number of queries run)."""
+        output = io.StringIO()
+        recorder = QueryRecorder()
+        with contextlib.redirect_stdout(output), \
+                connection.execute_wrapper(recorder):
+            call_command("degree_program_import", self.path, *args)
+        return (models.Catalog.objects.order_by("-id").first(),
+                output.getvalue(), len(recorder.queries))
+
+    def catalog_rows(self, catalog):
+        """Return everything the import wrote for catalog, without ids."""
+        return {
+            "courses":sorted(models.CatalogCourse.objects.filter(
+                catalog=catalog).values_list("course_id", "label",
+                                             "lower_credit_bound",
+                                             "upper_credit_bound")),
+            "outcomes":sorted(models.CourseLearningOutcome.objects.filter(
+                catalog=catalog).values_list("course_id",
+                                             "learning_outcome_id")),
+            "specific":sorted(models.DPCourseSpecific.objects.filter(
+                degree_program__catalog=catalog).values_list(
+                    "degree_program__label", "course_id", "elective")),
+            "generic":sorted(models.DPCourseGeneric.objects.filter(
+                degree_program__catalog=catalog).values_list(
+                    "degree_program__label", "credit_type_id", "credits",
+                    "elective")),
+            "substitutes":sorted(
+                models.DPCourseSubstituteSpecific.objects.filter(
+                    parent_course__degree_program__catalog=catalog
+                ).values_list("parent_course__degree_program__label",
+                              "parent_course__course_id", "course_id"))}
+
+    def test_cache_size_doesnt_change_rows(self):
+        small, small_output, small_queries = self.run_import(
+            "--course-cache", "1")
+        default, default_output, default_queries = self.run_import()
+        rows = self.catalog_rows(default)
+        self.assertEqual(self.catalog_rows(small), rows)
+        self.assertEqual(rows["courses"],
+                         [("BUS 101", "Business", 3.0, 5.0),
+                          ("CS 141", "Programming", 5.0, 5.0),
+                          ("ENGL& 101", "English", 5.0, 5.0),
+                          ("MATH 110", "Algebra", 5.0, 5.0),
+                          ("MATH 111", "Algebra II", 5.0, 5.0)])
+        self.assertIn(("MATH 110", 2), rows["outcomes"])
+        self.assertEqual(rows["generic"],
+                         [("ATA - Alpha", "H", 5.0, False)])
+        self.assertEqual(rows["substitutes"],
+                         [("ATA - Alpha", "MATH 110", "MATH 111")])
+        self.assertIn(("ATA - Beta", "BUS 101", True), rows["specific"])
+        # Every repeat of an unchanged course is skipped with room for all of
+        # them, only the back to back ENGL& 101 with room for one
+        self.assertIn("4 unchanged course saves skipped.", default_output)
+        self.assertIn("1 unchanged course saves skipped.", small_output)
+        self.assertLess(default_queries, small_queries)
+
+    def test_import_context(self):
+        catalog = models.Catalog.objects.create(label="Context")
+        context = import_context.ImportContext(catalog, max_courses=2)
+        algebra = models.Course.objects.create(id="MATH 110", label="Algebra",
+                                               lower_credit_bound=5,
+                                               upper_credit_bound=5)
+        context.remember_course(algebra)
+        self.assertIs(context.saved_course("MATH 110", "Algebra", 5, 5),
+                      algebra)
+        self.assertIsNone(context.saved_course("MATH 110", "Algebra", 4, 4))
+        self.assertIsNone(context.saved_course("MATH 111", "Algebra II", 5,
+                                               5))
+        with self.assertNumQueries(1):
+            self.assertEqual(context.course_outcome_ids("MATH 110"), set())
+            self.assertIs(context.course("MATH 110"), algebra)
+            context.course_outcome_ids("MATH 110")
+        self.assertEqual((context.course_hits, context.course_misses,
+                          context.outcome_hits, context.outcome_misses,
+                          context.skipped_saves), (2, 0, 1, 1, 1))
+        # Two more courses push the least recently used one out
+        for number in (111, 112):
+            context.remember_course(models.Course(id="MATH {}".format(number),
+                                                  label="Other"))
+        self.assertIsNone(context.saved_course("MATH 110", "Algebra", 5, 5))
+        with self.assertNumQueries(1):
+            self.assertEqual(context.course("MATH 110").id, "MATH 110")
+        self.assertEqual(context.course_misses, 1)
+        self.assertIn("3 course lookups, 2 from the cache (67%).",
+                      context.summary())
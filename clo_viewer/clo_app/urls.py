@@ -8,5 +8,11 @@ urlpatterns = [
     url(r'^programs/$', views.programs, name="programs"),
     url(r'^outcomes/$', views.outcomes, name="outcomes"),
     url(r'^degreeprogram/(?P<pid>[0-9]+)$', views.degree_program, name="degree-program"),
+    url(r'^degreeprogram/(?P<pid>[0-9]+)/diff/(?P<catalog_id>[0-9]+)$', views.degree_program_diff, name="degree-program-diff"),
+    url(r'^compare/$', views.compare, name="compare"),
+    url(r'^audit/credits/$', views.credit_audit, name="credit-audit"),
+    url(r'^impact/$', views.course_impact, name="course-impact"),
+    url(r'^impact/json$', views.course_impact_json, name="course-impact-json"),
+    url(r'^impact/course/(?P<course_id>[^/]+)$', views.course_impact_lookup, name="course-impact-lookup"),
     url(r'^clo/(?P<clo_id>[0-9]+)$', views.clo, name="clo"),
 ]
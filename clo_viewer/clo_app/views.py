@@ -1,8 +1,14 @@
 from django.shortcuts import render
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, JsonResponse
 
 
 from . import models
+from . import catalogs
+from . import comparison
+from . import credits
+from . import fragments
+from . import impact
+from . import matrices
 
 # Create your views here.
 
@@ -20,10 +26,13 @@ def about(request):
 def programs(request):
     """Display a list of degree programs at EvCC and their associated 
     information page links."""
-    programs = models.DegreeProgram.objects.all()
+    catalog = catalogs.requested_catalog(request)
+    programs = catalogs.programs_in(catalog)
     return render(request,
                   'programs.html',
-                  {"programs":programs})
+                  {"programs":programs,
+                   "catalog":catalog,
+                   "catalogs":models.Catalog.objects.order_by("-id")})
 
 def degree_program(request, pid):
     """Given a degree program, show the following information:
@@ -33,38 +42,135 @@ def degree_program(request, pid):
     - A comparison of the curriculum similarity this degree program has to every other degree program"""
     ref_degree_program_id = pid
     rdp_object = models.DegreeProgram.objects.get(id=ref_degree_program_id)
-    # Get courses in program
-    courses = models.Course.objects.filter(
-        dpcoursespecific__degree_program=ref_degree_program_id)
-    course_clo_pairs = []
-    for course in courses:
-        course_outcomes = [False] * models.CoreLearningOutcome.objects.all().count()
-        clo_raw = models.CoreLearningOutcome.objects.filter(
-            courselearningoutcome__course=course).order_by("id")
-        for outcome_placeholder in enumerate(course_outcomes):
-            if clo_raw.filter(id=outcome_placeholder[0]).exists():
-                course_outcomes[outcome_placeholder[0]] = True
-        course_clo_pairs.append((course, course_outcomes))
-    # Get program distances
-    program_distances = []
-    for degree_program in models.DegreeProgram.objects.exclude(
-            id=ref_degree_program_id):
-        union = models.Course.objects.none().union(
-            models.DPCourseSpecific.objects.filter(
-                degree_program=ref_degree_program_id),
-            models.DPCourseSpecific.objects.filter(
-                degree_program=degree_program.id)).count()
-        overlap = models.Course.objects.filter(
-            dpcoursespecific__degree_program__id=ref_degree_program_id).filter(
-                dpcoursespecific__degree_program__id=degree_program.id).count()
-        program_distances.append((degree_program, (overlap / union) * 100))
-    program_distances.sort(key=lambda distance: distance[1])
-    
+
+    def build_tables():
+        # Get courses in program, as the program's own catalog describes them
+        courses = catalogs.describe_courses(
+            models.Course.objects.filter(
+                dpcoursespecific__degree_program=ref_degree_program_id),
+            rdp_object.catalog_id)
+        course_outcomes = matrices.course_outcomes(
+            [course.id for course in courses], rdp_object.catalog_id)
+        clo_ids = list(models.CoreLearningOutcome.objects.order_by(
+            "id").values_list("id", flat=True))
+        course_clo_pairs = []
+        for course in courses:
+            mask = course_outcomes.get(course.id, 0)
+            course_clo_pairs.append(
+                (course, [bool(mask & matrices.outcome_bit(clo_id))
+                          for clo_id in clo_ids]))
+        # Get program distances
+        program_distances = []
+        for degree_program in catalogs.programs_in(rdp_object.catalog).exclude(
+                id=ref_degree_program_id):
+            union = models.Course.objects.none().union(
+                models.DPCourseSpecific.objects.filter(
+                    degree_program=ref_degree_program_id),
+                models.DPCourseSpecific.objects.filter(
+                    degree_program=degree_program.id)).count()
+            overlap = models.Course.objects.filter(
+                dpcoursespecific__degree_program__id=ref_degree_program_id).filter(
+                    dpcoursespecific__degree_program__id=degree_program.id).count()
+            program_distances.append((degree_program, (overlap / union) * 100))
+        program_distances.sort(key=lambda distance: distance[1])
+        return {"course_rows":fragments.course_rows(course_clo_pairs),
+                "distance_rows":fragments.distance_rows(program_distances)}
+    # The tables are the slow part of the page, so build them once per data
+    # version and serve them from the cache after that
+    tables = fragments.cached(fragments.cache_key("degree_program", pid),
+                              build_tables)
+
     return render(request,
                   'degree_program.html',
                   {"reference_program":rdp_object,
-                   "course_clo_pairs":course_clo_pairs,
-                   "program_distances":program_distances})
+                   "tables":tables,
+                   "credits":credits.program_credits(rdp_object),
+                   "other_catalogs":models.Catalog.objects.exclude(
+                       id=rdp_object.catalog_id).order_by("-id")})
+
+def degree_program_diff(request, pid, catalog_id):
+    """Show how a degree program changed between its own catalog and another 
+    one: which courses came and went, and how coverage of each core learning 
+    outcome moved. Both sides come out of precomputed catalog snapshots."""
+    rdp_object = models.DegreeProgram.objects.select_related("catalog").get(
+        id=pid)
+    other_catalog = models.Catalog.objects.get(id=catalog_id)
+    this_snapshot = catalogs.snapshot(rdp_object.catalog)
+    other_snapshot = catalogs.snapshot(other_catalog)
+    diff = catalogs.diff_program(other_snapshot.get(rdp_object.label),
+                                 this_snapshot.get(rdp_object.label))
+    outcome_labels = dict(models.CoreLearningOutcome.objects.values_list(
+        "id", "label"))
+    for change in diff["outcomes"]:
+        change["label"] = outcome_labels.get(change["clo_id"], "")
+    return render(request,
+                  'degree_program_diff.html',
+                  {"reference_program":rdp_object,
+                   "other_catalog":other_catalog,
+                   "in_other_catalog":rdp_object.label in other_snapshot,
+                   "diff":diff})
+
+def compare(request):
+    """Compare two or more degree programs side by side: shared courses, 
+    courses unique to each program, credit totals and how many courses in each 
+    program provide every core learning outcome.
+
+    Programs are given as ?programs=1,2,3 or repeated ?programs= parameters."""
+    program_ids = []
+    for value in request.GET.getlist("programs"):
+        for pid in value.split(","):
+            if pid.strip().isdigit() and int(pid) not in program_ids:
+                program_ids.append(int(pid))
+    return render(request,
+                  'compare.html',
+                  comparison.compare_programs(program_ids))
+
+def credit_audit(request):
+    """List every degree program in the catalog with its computed credit 
+    totals, flagging the ones whose courses don't add up to the credits the 
+    program declares."""
+    catalog = catalogs.requested_catalog(request)
+    program_credits = credits.catalog_credits(catalog)
+    return render(request,
+                  'credit_audit.html',
+                  {"catalog":catalog,
+                   "program_credits":program_credits,
+                   "problem_count":sum(1 for program, totals in program_credits
+                                       if totals.problems)})
+
+def course_impact(request):
+    """List every course in the catalog with how many programs depend on it 
+    and how much, sorted by the column given with ?sort=."""
+    catalog = catalogs.requested_catalog(request)
+    sort = request.GET.get("sort", "program_count")
+    if sort not in impact.SORT_FIELDS:
+        sort = "program_count"
+    return render(request,
+                  'course_impact.html',
+                  {"catalog":catalog,
+                   "sort":sort,
+                   "courses":impact.catalog_impact(catalog, sort)})
+
+def course_impact_json(request):
+    """The course impact list as JSON, taking the same parameters as the 
+    page."""
+    catalog = catalogs.requested_catalog(request)
+    sort = request.GET.get("sort", "program_count")
+    if sort not in impact.SORT_FIELDS:
+        sort = "program_count"
+    return JsonResponse({"catalog":catalog.id if catalog else None,
+                         "sort":sort,
+                         "courses":[impact.as_dict(row) for row in
+                                    impact.catalog_impact(catalog, sort)]})
+
+def course_impact_lookup(request, course_id):
+    """The impact figures for a single course as JSON."""
+    catalog = catalogs.requested_catalog(request)
+    row = impact.course_impact(catalog, course_id)
+    if row is None:
+        return JsonResponse({"error":"No program in the catalog uses {}.".format(
+            course_id)}, status=404)
+    return JsonResponse(impact.as_dict(row))
 
 def outcomes(request):
     """Return a list of core learning outcomes and links to their associated pages."""
@@ -81,16 +187,31 @@ def clo(request, clo_id):
     - What classes in specific use this core learning outcome.
     - Degree Programs sorted by which ones use this core learning outcome most to least."""
     clo = models.CoreLearningOutcome.objects.get(id=clo_id)
-    courses = models.Course.objects.filter(courselearningoutcome__learning_outcome=clo)
-    clo_total = courses.count()
-    total_classes = models.Course.objects.all().count()
-    programs = models.DegreeProgram.objects.all()
+    catalog = catalogs.requested_catalog(request)
+    # Every catalog has its own outcome links, so only look at this one's
+    provides_clo = {"courselearningoutcome__learning_outcome":clo}
+    if catalog is not None:
+        provides_clo["courselearningoutcome__catalog"] = catalog
+    courses = models.Course.objects.filter(**provides_clo)
+    if catalog is not None:
+        total_classes = models.CatalogCourse.objects.filter(
+            catalog=catalog).count()
+    else:
+        # Without a catalog the same link can turn up once per catalog
+        courses = courses.distinct()
+        total_classes = models.Course.objects.all().count()
+    courses = catalogs.describe_courses(courses, catalog)
+    clo_total = len(courses)
+    programs = catalogs.programs_in(catalog)
     program_pairs = []
     for program in programs:
         times_used = models.DPCourseSpecific.objects.filter(
             degree_program=program).filter(
-                course__courselearningoutcome__learning_outcome=clo).count()
-        program_pairs.append((program, times_used))
+                **{"course__" + lookup:value
+                   for lookup, value in provides_clo.items()})
+        if catalog is None:
+            times_used = times_used.distinct()
+        program_pairs.append((program, times_used.count()))
     program_pairs.sort(key=lambda pair: pair[1])
     return render(request,
                   'clo.html',
@@ -37,7 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'clo_app',
+    'clo_app.apps.CloAppConfig',
 ]
 
 MIDDLEWARE = [
@@ -78,10 +78,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Keep connections open between requests instead of reconnecting
+        'CONN_MAX_AGE': 600,
+        # 0002 drops the primary key CourseLearningOutcome points at, which
+        # newer SQLite refuses to replay on a fresh database, so build the
+        # test database straight from the models instead.
+        'TEST': {
+            'MIGRATE': False,
+        },
     }
 }
 
 
+# Applied to every new SQLite connection in this order, see clo_app/sqlite.py
+# synchronous=NORMAL is safe under WAL while syncing far less often.
+
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,  # 256 MB
+    'cache_size': -65536,  # Negative means KiB, so 64 MB
+    'temp_store': 'MEMORY',
+}
+
+# WAL lets readers keep going while an import writes. The journal mode is
+# stored in the database file, so the commands that write switch it once
+# rather than every connection rewriting the file header.
+
+SQLITE_JOURNAL_MODE = 'WAL'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
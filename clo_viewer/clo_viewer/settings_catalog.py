@@ -0,0 +1,41 @@
+"""
+Lean settings for serving the public catalog.
+
+The public site doesn't use the admin, logins, sessions or messages, but the
+default settings load all of them into every worker and management command.
+This profile keeps only what the catalog pages need so workers start faster.
+Point DJANGO_SETTINGS_MODULE at clo_viewer.settings_catalog to use it, and
+keep using clo_viewer.settings wherever you need the admin. Request workers
+should use clo_viewer.settings_catalog_web, which builds on this profile.
+"""
+
+from .settings import *
+
+INSTALLED_APPS = [
+    'django.contrib.staticfiles',
+    'clo_app.apps.CloAppConfig',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'clo_viewer.urls_catalog'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+            ],
+        },
+    },
+]
+
+AUTH_PASSWORD_VALIDATORS = []
@@ -0,0 +1,18 @@
+"""
+Settings for the request workers serving the public catalog.
+
+These are the lean clo_viewer.settings_catalog settings with read-only,
+persistent database connections. Only use them for the WSGI workers: the
+importer, migrate and run_worker all write, so management commands keep using
+clo_viewer.settings_catalog or clo_viewer.settings.
+"""
+
+from .settings_catalog import *
+
+# Request workers never write, so open every connection read-only and keep it
+# for the life of the worker.
+SQLITE_PRAGMAS = dict(SQLITE_PRAGMAS, query_only='ON')
+
+DATABASES = {
+    'default': dict(DATABASES['default'], CONN_MAX_AGE=None),
+}
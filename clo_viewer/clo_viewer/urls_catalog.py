@@ -0,0 +1,9 @@
+"""clo_viewer URL Configuration for the lean catalog settings
+
+Same as clo_viewer.urls without the admin, which isn't installed there.
+"""
+from django.conf.urls import url, include
+
+urlpatterns = [
+    url(r'^', include('clo_app.urls')),
+]
@@ -3,6 +3,10 @@ WSGI config for clo_viewer project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+Workers that only serve the public catalog can set DJANGO_SETTINGS_MODULE to
+clo_viewer.settings_catalog_web, which leaves out the admin and friends, so
+starts up faster, and opens the database read-only.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/1.11/howto/deployment/wsgi/
 """